@@ -0,0 +1,67 @@
+import asyncio
+import functools
+import time
+import typing as t
+
+import discord
+
+__all__ = ("AutocompleteTracker",)
+
+ValueT = t.TypeVar("ValueT")
+
+_Key = t.Tuple[int, str]
+
+
+class AutocompleteTracker(t.Generic[ValueT]):
+    # Discord sends an autocomplete interaction for every keystroke and ignores responses
+    # that take longer than three seconds. Requests are tracked per user and option, each
+    # one waits `delay` seconds first and is dropped if a newer keystroke came in meanwhile.
+    # Fetches that can't finish within `deadline` are answered with the freshest value we
+    # have for the same lookup, and keep running so the next keystroke can use them.
+    __slots__ = ("delay", "deadline", "_latest", "_values")
+
+    def __init__(self, *, delay: float, deadline: float) -> None:
+        self.delay = delay
+        self.deadline = deadline
+        self._latest: t.Dict[_Key, int] = {}
+        self._values: t.Dict[_Key, t.Tuple[t.Hashable, ValueT]] = {}
+
+    async def run(
+        self,
+        interaction: discord.Interaction[t.Any],
+        option: str,
+        lookup: t.Hashable,
+        func: t.Callable[[], t.Awaitable[ValueT]],
+    ) -> t.Optional[ValueT]:
+        # Returns None when the request was superseded or nothing could be found in time.
+        started = time.monotonic()
+        key = (interaction.user.id, option)
+        self._latest[key] = interaction.id
+        try:
+            if self.delay > 0:
+                await asyncio.sleep(self.delay)
+
+            if self._latest.get(key) != interaction.id:
+                return None
+
+            task = asyncio.ensure_future(func())
+            task.add_done_callback(functools.partial(self._store, key, lookup))
+            remaining = self.deadline - (time.monotonic() - started)
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), max(remaining, 0.0))
+            except asyncio.TimeoutError:
+                return self.last(interaction, option, lookup)
+        finally:
+            if self._latest.get(key) == interaction.id:
+                del self._latest[key]
+
+    def last(
+        self, interaction: discord.Interaction[t.Any], option: str, lookup: t.Hashable
+    ) -> t.Optional[ValueT]:
+        entry = self._values.get((interaction.user.id, option))
+        return entry[1] if entry is not None and entry[0] == lookup else None
+
+    def _store(self, key: _Key, lookup: t.Hashable, task: "asyncio.Future[ValueT]") -> None:
+        # Also retrieves the exception of fetches nobody waits for anymore.
+        if not task.cancelled() and task.exception() is None:
+            self._values[key] = (lookup, task.result())
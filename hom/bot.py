@@ -1,10 +1,19 @@
+import typing as t
 from pathlib import Path
 
 import aiohttp
 import discord
 from discord.ext import commands
 
+from hom.config import Config
 from hom.config import Constants
+from hom.deletions import deletions
+from hom.github import GitHubClient
+from hom.http import ConnectionStats
+from hom.http import create_session
+from hom.storage import Database
+from hom.tickets import tickets
+from hom.transcripts import TranscriptStore
 from hom.wom import WomClient
 
 __all__ = ("Bot",)
@@ -18,13 +27,31 @@ class Bot(commands.Bot):
             help_command=None,
         )
         self.wom: WomClient
+        self.github: GitHubClient
+        self.session: t.Optional[aiohttp.ClientSession] = None
+        self.http_stats = ConnectionStats()
+        self.db = Database(Config.HOM_DATABASE_PATH)
+        self.transcripts = TranscriptStore(self.db)
 
     async def setup_hook(self) -> None:
-        session = aiohttp.ClientSession()
-        self.wom = WomClient(session)
+        await self.db.connect()
+        await self.transcripts.load()
+        await tickets.load(self.db)
+        await deletions.load(self.db, self)
+        self.session = create_session(self.http_stats)
+        self.wom = WomClient(self.session)
+        self.github = GitHubClient(self.session, Config.HOM_GITHUB_TOKEN_CACHE_PATH)
+        await self.github.load_cache()
         for path in Path("./hom/cogs").glob("[!_]*.py"):
             await self.load_extension(f"hom.cogs.{path.stem}")
 
+    async def close(self) -> None:
+        await super().close()
+        if self.session is not None:
+            await self.session.close()
+
+        await self.db.close()
+
     async def on_ready(self) -> None:
         user = self.user.display_name if self.user else "Bot"
         print(f"{user} has connected to Discord!")
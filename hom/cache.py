@@ -0,0 +1,154 @@
+import asyncio
+import functools
+import time
+import typing as t
+from collections import OrderedDict
+
+__all__ = ("SingleFlight", "TTLCache", "caches")
+
+KeyT = t.TypeVar("KeyT", bound=t.Hashable)
+ValueT = t.TypeVar("ValueT")
+
+
+class TTLCache(t.Generic[KeyT, ValueT]):
+    # Entries expire after `ttl` seconds and are evicted least recently used first once
+    # either `maxsize` entries or `maxweight` total weight (as measured by `weigh`) is exceeded.
+    __slots__ = (
+        "name",
+        "ttl",
+        "maxsize",
+        "maxweight",
+        "hits",
+        "misses",
+        "_weigh",
+        "_data",
+        "_weight",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        ttl: float,
+        maxsize: int,
+        maxweight: t.Optional[int] = None,
+        weigh: t.Optional[t.Callable[[ValueT], int]] = None,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.hits = 0
+        self.misses = 0
+        self._weigh = weigh or (lambda _: 1)
+        self._data: t.OrderedDict[KeyT, t.Tuple[ValueT, float, int]] = OrderedDict()
+        self._weight = 0
+        caches[name] = self
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def weight(self) -> int:
+        return self._weight
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: KeyT) -> t.Optional[ValueT]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: KeyT) -> t.Optional[ValueT]:
+        # Like get, but leaves the hit/miss counters and the eviction order alone.
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+
+        return entry[0]
+
+    def set(self, key: KeyT, value: ValueT) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+
+        weight = self._weigh(value)
+        if self.maxweight is not None and weight > self.maxweight:
+            # A single oversized value would evict everything else, don't bother.
+            self.pop(key)
+            return
+
+        self.pop(key)
+        self._data[key] = (value, time.monotonic() + self.ttl, weight)
+        self._weight += weight
+        self._evict()
+
+    def pop(self, key: KeyT) -> t.Optional[ValueT]:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+
+        self._weight -= entry[2]
+        return entry[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._weight = 0
+
+    def _evict(self) -> None:
+        while len(self._data) > self.maxsize or (
+            self.maxweight is not None and self._weight > self.maxweight
+        ):
+            _, (_, _, weight) = self._data.popitem(last=False)
+            self._weight -= weight
+
+
+class SingleFlight(t.Generic[KeyT, ValueT]):
+    # Concurrent callers asking for the same key share a single underlying call. The call
+    # runs in its own task and every caller awaits it through a shield, so cancelling one
+    # caller never cancels the call the others are still waiting on.
+    __slots__ = ("_calls",)
+
+    def __init__(self) -> None:
+        self._calls: t.Dict[KeyT, "asyncio.Future[ValueT]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: KeyT, func: t.Callable[[], t.Awaitable[ValueT]]) -> ValueT:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(functools.partial(self._finish, key))
+
+        return await asyncio.shield(call)
+
+    def forget(self, key: KeyT) -> None:
+        # Later callers start a fresh call, current waiters still get the old result.
+        self._calls.pop(key, None)
+
+    def _finish(self, key: KeyT, call: "asyncio.Future[ValueT]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+        # Mark the exception as retrieved in case every caller was cancelled.
+        if not call.cancelled():
+            call.exception()
+
+
+# Every cache registers itself here by name so their counters can be reported on.
+caches: t.Dict[str, "TTLCache[t.Any, t.Any]"] = {}
@@ -1,75 +1,162 @@
+import asyncio
+import datetime
+import functools
 from typing import Any
 from typing import List
 from typing import Optional
 from typing import Set
+from typing import Tuple
 
+import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 from hom import utils
+from hom.autocomplete import AutocompleteTracker
 from hom.bot import Bot
+from hom.cache import TTLCache
+from hom.config import Config
 from hom.config import Constants
+from hom.models import Competition as CompetitionModel
+from hom.models import ParticipationWithCompetition
+from hom.models import WomDecodeError
+from hom.ratelimit import TokenBucket
+from hom.search import SearchIndex
+from hom.wom import WomUnavailableError
 
 __all__ = ("Competition",)
 
+_NO_DATE = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+def _recency(competition: CompetitionModel) -> datetime.datetime:
+    return competition.ends_at or competition.starts_at or _NO_DATE
+
 
 class Competition(commands.GroupCog, name="competition"):
     def __init__(self, bot: Bot) -> None:
         super().__init__()
         self.bot = bot
+        self._competitions: TTLCache[str, List[ParticipationWithCompetition]] = TTLCache(
+            "player_competitions",
+            ttl=Config.HOM_COMPETITIONS_CACHE_TTL,
+            maxsize=Config.HOM_COMPETITIONS_CACHE_SIZE,
+        )
+        self._indexes: TTLCache[
+            str, Tuple[List[ParticipationWithCompetition], SearchIndex[CompetitionModel]]
+        ] = TTLCache(
+            "player_competition_indexes",
+            ttl=Config.HOM_COMPETITIONS_CACHE_TTL,
+            maxsize=Config.HOM_COMPETITIONS_CACHE_SIZE,
+        )
+        self._autocomplete: AutocompleteTracker[
+            Optional[List[ParticipationWithCompetition]]
+        ] = AutocompleteTracker(
+            delay=Config.HOM_AUTOCOMPLETE_DEBOUNCE,
+            deadline=Config.HOM_AUTOCOMPLETE_DEADLINE,
+        )
 
-    async def competition_autocomplete(
-        self,
-        interaction: discord.Interaction[Any],
-        current: str,
-    ) -> List[app_commands.Choice[int]]:
-        username = getattr(interaction.namespace, "username", None)
+    @staticmethod
+    def _competitions_key(username: str) -> str:
+        return username.strip().lower()
 
-        if not username:
-            return []
+    async def get_player_competitions(
+        self, username: str
+    ) -> Optional[List[ParticipationWithCompetition]]:
+        key = self._competitions_key(username)
+        if (cached := self._competitions.get(key)) is not None:
+            return cached
 
         data = await self.bot.wom.get_player_competitions(username)
+        if data is not None:
+            self._competitions.set(key, data)
 
-        if not data:
-            return []
-
-        search = current.lower().strip()
-        choices: List[app_commands.Choice[int]] = []
+        return data
 
-        for competition in data:
-            comp_id = competition.get("competitionId")
-            comp_name = competition.get("competition", {}).get("title")
+    async def _autocomplete_competitions(
+        self, interaction: discord.Interaction[Any], option: str
+    ) -> Optional[List[ParticipationWithCompetition]]:
+        username = getattr(interaction.namespace, "username", None)
+        if not username:
+            return None
+
+        # Cached lookups are answered right away, only upstream calls are debounced. Peek
+        # first so keystrokes that get debounced away aren't counted as cache misses, the
+        # lookup that does run counts once.
+        key = self._competitions_key(username)
+        if (
+            self._competitions.peek(key) is not None
+            and (cached := self._competitions.get(key)) is not None
+        ):
+            return cached
+
+        try:
+            return await self._autocomplete.run(
+                interaction, option, key, functools.partial(self.get_player_competitions, username)
+            )
+        except (WomUnavailableError, WomDecodeError):
+            return self._autocomplete.last(interaction, option, key)
+
+    def _competition_index(
+        self, interaction: discord.Interaction[Any], data: List[ParticipationWithCompetition]
+    ) -> SearchIndex[CompetitionModel]:
+        # Built once per cached list, every keystroke after that only searches it.
+        key = self._competitions_key(getattr(interaction.namespace, "username", None) or "")
+        if (cached := self._indexes.get(key)) is not None and cached[0] is data:
+            return cached[1]
+
+        competitions = {entry.competition_id: entry.competition for entry in data}
+        index: SearchIndex[CompetitionModel] = SearchIndex(
+            (competition, (str(competition.id), competition.title, competition.group_name or ""))
+            for competition in sorted(competitions.values(), key=_recency, reverse=True)
+        )
+        self._indexes.set(key, (data, index))
+        return index
 
-            if not isinstance(comp_id, int):
-                continue
+    async def _remove_participant(
+        self,
+        competition_id: int,
+        username: str,
+        semaphore: asyncio.Semaphore,
+        budget: TokenBucket,
+    ) -> Tuple[int, str]:
+        async with semaphore:
+            await budget.acquire()
+            try:
+                return await asyncio.wait_for(
+                    self.bot.wom.remove_competition_participant(competition_id, username),
+                    timeout=Config.HOM_COMPETITION_REMOVAL_TIMEOUT,
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError, WomUnavailableError) as exc:
+                return 0, str(exc) or type(exc).__name__
 
-            comp_id_str = str(comp_id)
+    async def competition_autocomplete(
+        self,
+        interaction: discord.Interaction[Any],
+        current: str,
+    ) -> List[app_commands.Choice[int]]:
+        if not (data := await self._autocomplete_competitions(interaction, "competition_id")):
+            return []
 
-            if not search or search in comp_id_str.lower():
-                label = f"{comp_id} - {comp_name}"
+        choices: List[app_commands.Choice[int]] = []
+        for competition in self._competition_index(interaction, data).search(current):
+            label = f"{competition.id} - {competition.title}"
 
-                # Discord choice names have a max length of 100 chars
-                if len(label) > 100:
-                    label = label[:97] + "..."
+            # Discord choice names have a max length of 100 chars
+            if len(label) > 100:
+                label = label[:97] + "..."
 
-                choices.append(app_commands.Choice(name=label, value=int(comp_id)))
+            choices.append(app_commands.Choice(name=label, value=competition.id))
 
-        return choices[:25]
+        return choices
 
     async def group_autocomplete(
         self,
         interaction: discord.Interaction[Any],
         current: str,
     ) -> List[app_commands.Choice[int]]:
-        username = getattr(interaction.namespace, "username", None)
-
-        if not username:
-            return []
-
-        data = await self.bot.wom.get_player_competitions(username)
-
-        if not data:
+        if not (data := await self._autocomplete_competitions(interaction, "group_id")):
             return []
 
         search = current.lower().strip()
@@ -78,11 +165,10 @@ class Competition(commands.GroupCog, name="competition"):
         seen: Set[int] = set()
 
         for entry in data:
-            competition = entry.get("competition", {})
-            group_id = competition.get("groupId")
-            group_name = competition.get("group", {}).get("name", "")
+            group_id = entry.competition.group_id
+            group_name = entry.competition.group_name or ""
 
-            if not isinstance(group_id, int) or group_id in seen:
+            if group_id is None or group_id in seen:
                 continue
 
             seen.add(group_id)
@@ -95,10 +181,18 @@ class Competition(commands.GroupCog, name="competition"):
                 if len(label) > 100:
                     label = label[:97] + "..."
 
-                choices.append(app_commands.Choice(name=label, value=int(group_id)))
+                choices.append(app_commands.Choice(name=label, value=group_id))
 
         return choices[:25]
 
+    async def cog_app_command_error(
+        self,
+        interaction: discord.Interaction[Any],
+        error: app_commands.AppCommandError,
+    ) -> None:
+        if not await utils.handle_wom_error(interaction, error):
+            raise error
+
     @app_commands.guild_only()  # type: ignore[arg-type]
     @app_commands.describe(
         username="The username of the player you are removing from competitions.",
@@ -156,7 +250,7 @@ class Competition(commands.GroupCog, name="competition"):
             else:
                 successful_competitions.append(str(competition_id))
         else:
-            data = await self.bot.wom.get_player_competitions(username)
+            data = await self.get_player_competitions(username)
 
             if not data:
                 await interaction.followup.send(
@@ -164,25 +258,33 @@ class Competition(commands.GroupCog, name="competition"):
                 )
                 return
 
-            for comp in data:
-                comp_id = comp["competitionId"]
-
-                if group_id == comp["competition"]["groupId"]:
-                    status, text = await self.bot.wom.remove_competition_participant(
-                        comp_id, username
-                    )
-
-                    if status != 200:
-                        if (
-                            "cannot remove all competition participants" in text.lower()
-                            or "none of the players given were competing" in text.lower()
-                        ):
-                            skipped_competitions.append(str(comp_id))
-                        else:
-                            error_competitions.append(str(comp_id))
-                        continue
-
-                    successful_competitions.append(str(comp_id))
+            comp_ids = [
+                entry.competition_id for entry in data if group_id == entry.competition.group_id
+            ]
+            semaphore = asyncio.Semaphore(Config.HOM_COMPETITION_REMOVAL_CONCURRENCY)
+            budget = TokenBucket(Config.HOM_COMPETITION_REMOVAL_RATE)
+            results = await asyncio.gather(
+                *(
+                    self._remove_participant(comp_id, username, semaphore, budget)
+                    for comp_id in comp_ids
+                )
+            )
+
+            for comp_id, (status, text) in zip(comp_ids, results):
+                if status != 200:
+                    if (
+                        "cannot remove all competition participants" in text.lower()
+                        or "none of the players given were competing" in text.lower()
+                    ):
+                        skipped_competitions.append(str(comp_id))
+                    else:
+                        error_competitions.append(str(comp_id))
+                    continue
+
+                successful_competitions.append(str(comp_id))
+
+        if successful_competitions:
+            self._competitions.pop(self._competitions_key(username))
 
         if not any([successful_competitions, error_competitions, skipped_competitions]):
             await interaction.followup.send(
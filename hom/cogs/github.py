@@ -1,11 +1,10 @@
+import asyncio
+import sqlite3
 import time
+import traceback
 import typing as t
-from datetime import datetime
-from pathlib import Path
 
 import discord
-import jwt
-import requests
 from discord import AppCommandType
 from discord import app_commands
 from discord.ext import commands
@@ -14,6 +13,9 @@ from hom import utils
 from hom.bot import Bot
 from hom.config import Config
 from hom.config import Constants
+from hom.github import GitHubAppAuthError
+from hom.github import GitHubRequestError
+from hom.ratelimit import backoff
 
 __all__ = ("GitHub",)
 
@@ -27,168 +29,12 @@ GITHUB_REPOSITORY_CHOICES: t.Final[t.List[app_commands.Choice[str]]] = [
     app_commands.Choice(name=repository, value=repository)
     for repository in Config.HOM_GITHUB_REPOSITORIES
 ]
-GITHUB_API_VERSION: t.Final[str] = "2022-11-28"
 DISCORD_INVITE_URL: t.Final[str] = "https://wiseoldman.net/discord"
-GITHUB_APP_CONFIGURATION_MESSAGE: t.Final[str] = (
-    "GitHub issue creation is not configured yet. Set `HOM_GITHUB_APP_ID` and "
-    "`HOM_GITHUB_PRIVATE_KEY_PATH` first."
-)
-_INSTALLATION_IDS_BY_REPOSITORY: t.Dict[str, int] = {}
-_INSTALLATION_TOKENS_BY_ID: t.Dict[int, t.Tuple[str, float]] = {}
-
-
-class GitHubAppAuthError(RuntimeError):
-    pass
-
-
-def _load_github_private_key() -> str:
-    path_value = Config.HOM_GITHUB_PRIVATE_KEY_PATH
-    if path_value:
-        try:
-            private_key = Path(path_value).expanduser().read_text(encoding="utf-8").strip()
-        except OSError as exc:
-            raise GitHubAppAuthError(
-                "GitHub App authentication could not read the configured private key file "
-                f"at `{path_value}`.\n"
-                f"```{str(exc)[:1800]}```"
-            ) from exc
-
-        if not private_key:
-            raise GitHubAppAuthError(
-                "GitHub App authentication found an empty private key file at " f"`{path_value}`."
-            )
-
-        return private_key
-
-    raise GitHubAppAuthError(GITHUB_APP_CONFIGURATION_MESSAGE)
-
-
-def _get_app_jwt() -> str:
-    if not Config.HOM_GITHUB_APP_ID:
-        raise GitHubAppAuthError(GITHUB_APP_CONFIGURATION_MESSAGE)
-
-    now = int(time.time())
-    payload = {
-        "iat": now - 60,
-        "exp": now + 600,
-        "iss": Config.HOM_GITHUB_APP_ID,
-    }
-
-    try:
-        return jwt.encode(
-            payload,
-            _load_github_private_key(),
-            algorithm="RS256",
-        )
-    except Exception as exc:
-        raise GitHubAppAuthError(
-            "GitHub App authentication could not generate a JWT from the configured "
-            "private key.\n"
-            f"```{str(exc)[:1800]}```"
-        ) from exc
-
-
-def _parse_github_timestamp(value: str) -> t.Optional[float]:
-    try:
-        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
-    except ValueError:
-        return None
-
-
-def _get_installation_id(repository: str, app_jwt: str) -> int:
-    cached_installation_id = _INSTALLATION_IDS_BY_REPOSITORY.get(repository)
-    if cached_installation_id is not None:
-        return cached_installation_id
-
-    try:
-        response = requests.get(
-            url=f"https://api.github.com/repos/{repository}/installation",
-            headers={
-                "Accept": "application/vnd.github+json",
-                "Authorization": f"Bearer {app_jwt}",
-                "User-Agent": "Helpful Old Man Discord Bot",
-                "X-GitHub-Api-Version": GITHUB_API_VERSION,
-            },
-            timeout=15,
-        )
-    except requests.RequestException as exc:
-        raise GitHubAppAuthError(
-            "GitHub App authentication could not reach GitHub while looking up the "
-            "repository installation.\n"
-            f"```{str(exc)[:1800]}```"
-        ) from exc
-
-    if response.status_code != 200:
-        error_message = _get_error_message(response)
-        raise GitHubAppAuthError(
-            "Could not find a GitHub App installation for the selected repository. "
-            "Make sure the app is installed on that repository.\n"
-            f"```{error_message[:1800]}```"
-        )
-
-    payload_obj = response.json()
-    if not isinstance(payload_obj, dict):
-        raise GitHubAppAuthError("GitHub returned an unexpected installation lookup response.")
-
-    installation_payload = t.cast(t.Dict[str, t.Any], payload_obj)
-    installation_id = installation_payload.get("id")
-    if not isinstance(installation_id, int):
-        raise GitHubAppAuthError("GitHub returned an unexpected installation lookup response.")
-
-    _INSTALLATION_IDS_BY_REPOSITORY[repository] = installation_id
-    return installation_id
-
-
-def _get_installation_token(repository: str) -> str:
-    app_jwt = _get_app_jwt()
-    installation_id = _get_installation_id(repository, app_jwt)
-
-    cached_token = _INSTALLATION_TOKENS_BY_ID.get(installation_id)
-    if cached_token is not None:
-        cached_token_value, cached_expiry_timestamp = cached_token
-        if time.time() < cached_expiry_timestamp - 60:
-            return cached_token_value
-
-    try:
-        response = requests.post(
-            url=f"https://api.github.com/app/installations/{installation_id}/access_tokens",
-            headers={
-                "Accept": "application/vnd.github+json",
-                "Authorization": f"Bearer {app_jwt}",
-                "User-Agent": "Helpful Old Man Discord Bot",
-                "X-GitHub-Api-Version": GITHUB_API_VERSION,
-            },
-            timeout=15,
-        )
-    except requests.RequestException as exc:
-        raise GitHubAppAuthError(
-            "GitHub App authentication could not reach GitHub while requesting an "
-            "installation token.\n"
-            f"```{str(exc)[:1800]}```"
-        ) from exc
-
-    if response.status_code != 201:
-        error_message = _get_error_message(response)
-        raise GitHubAppAuthError(
-            "GitHub rejected the installation token request.\n" f"```{error_message[:1800]}```"
-        )
-
-    payload_obj = response.json()
-    if not isinstance(payload_obj, dict):
-        raise GitHubAppAuthError("GitHub returned an unexpected installation token response.")
-
-    token_payload = t.cast(t.Dict[str, t.Any], payload_obj)
-    token_value = token_payload.get("token")
-    expires_at_value = token_payload.get("expires_at")
-    if not isinstance(token_value, str) or not isinstance(expires_at_value, str):
-        raise GitHubAppAuthError("GitHub returned an unexpected installation token response.")
-
-    expiry_timestamp = _parse_github_timestamp(expires_at_value)
-    if expiry_timestamp is None:
-        expiry_timestamp = time.time() + 3600
-
-    _INSTALLATION_TOKENS_BY_ID[installation_id] = (token_value, expiry_timestamp)
-    return token_value
+# Seconds between token refresh rounds when nothing expires sooner, and the minimum gap.
+_TOKEN_REFRESH_RETRY: t.Final[int] = 300
+_TOKEN_REFRESH_MIN_INTERVAL: t.Final[int] = 30
+# Seconds the issue outbox waits before carrying on after an unexpected error.
+_OUTBOX_ERROR_DELAY: t.Final[float] = 30.0
 
 
 def _truncate(value: str, max_length: int) -> str:
@@ -259,28 +105,24 @@ def _build_created_by_footer(created_by_display_name: str) -> str:
     return f"Created by **{created_by_display_name}** via [Discord]({DISCORD_INVITE_URL})"
 
 
-def _get_error_message(response: requests.Response) -> str:
-    try:
-        payload_obj = response.json()
-    except ValueError:
-        text = response.text.strip()
-        return text or f"GitHub returned HTTP {response.status_code}."
+def _outbox_marker(job_id: int) -> str:
+    # Hidden in the issue body, lets us find the issue again if we can't tell whether
+    # creating it went through.
+    return f"<!-- hom-outbox:{job_id} -->"
+
 
-    if not isinstance(payload_obj, dict):
-        return f"GitHub returned HTTP {response.status_code}."
+def _source_message_url(row: sqlite3.Row) -> str:
+    return (
+        f"https://discord.com/channels/{row['guild_id']}/{row['channel_id']}/"
+        f"{row['source_message_id']}"
+    )
 
-    payload: t.Mapping[str, t.Any] = payload_obj
-    message = payload.get("message")
-    if isinstance(message, str) and message.strip():
-        return message
 
-    errors = payload.get("errors")
-    if isinstance(errors, list) and errors:
-        typed_errors = t.cast(t.Sequence[t.Any], errors)
-        details = ", ".join(str(error) for error in typed_errors[:3])
-        return f"GitHub returned validation errors: {details}"
+def _source_message_line(row: sqlite3.Row) -> str:
+    if row["source_message_id"] is None:
+        return ""
 
-    return f"GitHub returned HTTP {response.status_code}."
+    return f"\nSource message: {_source_message_url(row)}"
 
 
 class CreateGitHubIssueModal(discord.ui.Modal):
@@ -373,6 +215,8 @@ class GitHub(commands.GroupCog, name="github"):
     def __init__(self, bot: Bot) -> None:
         super().__init__()
         self.bot = bot
+        self._issue_queued = asyncio.Event()
+        self._tasks: t.List["asyncio.Task[None]"] = []
         self.bot.tree.add_command(
             app_commands.ContextMenu(
                 name="Create GitHub Issue",
@@ -381,6 +225,14 @@ class GitHub(commands.GroupCog, name="github"):
             )
         )
 
+    async def cog_load(self) -> None:
+        self._tasks.append(asyncio.create_task(self._process_issue_outbox()))
+        self._tasks.append(asyncio.create_task(self._refresh_installation_tokens()))
+
+    async def cog_unload(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
     @staticmethod
     def _is_allowed_repository(repository: str) -> bool:
         return repository in Config.HOM_GITHUB_REPOSITORIES
@@ -420,106 +272,270 @@ class GitHub(commands.GroupCog, name="github"):
             return
 
         try:
-            token = _get_installation_token(repository)
+            await self.bot.github.ensure_configured()
         except GitHubAppAuthError as exc:
             await send_error(str(exc))
             return
 
+        assert interaction.guild is not None and interaction.channel_id is not None
+        now = time.time()
+        await self.bot.db.execute(
+            """
+            INSERT INTO github_issue_outbox (
+                repository, title, body, image_filename, image_url, guild_id, channel_id,
+                source_message_id, created_by_id, created_by_name, next_attempt_at, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                repository,
+                cleaned_title,
+                _build_issue_body(
+                    cleaned_body,
+                    image,
+                    _get_actor_display_name(interaction.user),
+                ),
+                image.filename if image is not None else None,
+                image.url if image is not None else None,
+                interaction.guild.id,
+                source_message.channel.id
+                if source_message is not None
+                else interaction.channel_id,
+                source_message.id if source_message is not None else None,
+                interaction.user.id,
+                _get_actor_display_name(interaction.user),
+                now,
+                now,
+            ),
+        )
+        self._issue_queued.set()
+
+        destination = (
+            "reply to the source message" if source_message is not None else "post it here"
+        )
+        content = f"Queued the issue for `{repository}`, I'll {destination} once it is created."
+        if public_success_response:
+            await interaction.edit_original_response(content=content)
+        else:
+            await interaction.followup.send(content, ephemeral=True)
+
+    async def _refresh_installation_tokens(self) -> None:
+        # Keeps a valid token around for every repository so creating an issue never has to
+        # wait on GitHub's installation and token endpoints.
+        if not Config.HOM_GITHUB_APP_ID or not Config.HOM_GITHUB_REPOSITORIES:
+            return
+
+        while True:
+            refresh_at = time.time() + _TOKEN_REFRESH_RETRY
+            for repository in Config.HOM_GITHUB_REPOSITORIES:
+                try:
+                    repository_refresh_at = await self.bot.github.refresh_installation_token(
+                        repository
+                    )
+                except (GitHubAppAuthError, GitHubRequestError) as exc:
+                    print(f"Could not refresh the GitHub token for {repository}: {exc}")
+                else:
+                    refresh_at = min(refresh_at, repository_refresh_at)
+
+            await asyncio.sleep(max(refresh_at - time.time(), _TOKEN_REFRESH_MIN_INTERVAL))
+
+    async def _process_issue_outbox(self) -> None:
+        await self.bot.wait_until_ready()
+
+        # Issues created right before a restart may not have been announced yet.
         try:
-            response = requests.post(
-                url=f"https://api.github.com/repos/{repository}/issues",
-                headers={
-                    "Accept": "application/vnd.github+json",
-                    "Authorization": f"Bearer {token}",
-                    "User-Agent": "Helpful Old Man Discord Bot",
-                    "X-GitHub-Api-Version": GITHUB_API_VERSION,
-                },
-                json={
-                    "title": cleaned_title,
-                    "body": _build_issue_body(
-                        cleaned_body,
-                        image,
-                        _get_actor_display_name(interaction.user),
-                    ),
-                },
-                timeout=15,
-            )
-        except requests.RequestException as exc:
-            await send_error(f"GitHub could not be reached right now.\n```{str(exc)[:1800]}```")
+            for job in await self.bot.db.fetchall(
+                "SELECT id FROM github_issue_outbox WHERE status = 'created'"
+            ):
+                await self._try_announce_issue(job["id"])
+        except Exception:
+            traceback.print_exc()
+
+        while True:
+            try:
+                await self._process_next_issue()
+            except Exception:
+                # A database or Discord error must not end the worker, nothing would restart it.
+                traceback.print_exc()
+                await asyncio.sleep(_OUTBOX_ERROR_DELAY)
+
+    async def _process_next_issue(self) -> None:
+        self._issue_queued.clear()
+        # Uncertain jobs may already have an issue, they are checked before posting again.
+        row = await self.bot.db.fetchone(
+            """
+            SELECT * FROM github_issue_outbox WHERE status IN ('pending', 'uncertain')
+            ORDER BY next_attempt_at, id LIMIT 1
+            """
+        )
+        if row is None:
+            await self._issue_queued.wait()
             return
 
-        if response.status_code != 201:
-            error_message = _get_error_message(response)
-            await send_error(
-                f"Failed to create an issue in `{repository}`.\n```{error_message[:1800]}```"
+        if (delay := row["next_attempt_at"] - time.time()) > 0:
+            try:
+                await asyncio.wait_for(self._issue_queued.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+            return
+
+        try:
+            created = await self._send_queued_issue(row)
+        except Exception as exc:
+            # Never let one bad job take the worker down with it. We can't tell how far
+            # it got, so check for an existing issue before posting it again.
+            traceback.print_exc()
+            await self._retry_issue(row, str(exc), None, uncertain=True)
+            return
+
+        if created:
+            await self._try_announce_issue(row["id"])
+
+    async def _send_queued_issue(self, row: sqlite3.Row) -> bool:
+        # Returns whether the issue now exists, it is announced separately.
+        try:
+            existing = None
+            if row["status"] == "uncertain":
+                existing = await self.bot.github.find_issue(
+                    row["repository"], _outbox_marker(row["id"]), row["created_at"]
+                )
+
+            issue_number, issue_url = existing or await self.bot.github.create_issue(
+                row["repository"], row["title"], f"{row['body']}\n\n{_outbox_marker(row['id'])}"
             )
+        except GitHubRequestError as exc:
+            if exc.retryable:
+                await self._retry_issue(row, str(exc), exc.retry_after, uncertain=exc.ambiguous)
+            else:
+                await self._fail_issue(row, str(exc))
+
+            return False
+        except GitHubAppAuthError as exc:
+            await self._fail_issue(row, str(exc))
+            return False
+
+        await self.bot.db.execute(
+            """
+            UPDATE github_issue_outbox
+            SET status = 'created', attempts = attempts + 1, issue_number = ?, issue_url = ?
+            WHERE id = ?
+            """,
+            (issue_number, issue_url, row["id"]),
+        )
+        return True
+
+    async def _retry_issue(
+        self,
+        row: sqlite3.Row,
+        error: str,
+        retry_after: t.Optional[float],
+        *,
+        uncertain: bool = False,
+    ) -> None:
+        # Waiting out a rate limit doesn't count as a failed attempt. Once a job is uncertain
+        # it stays that way, a later clean failure doesn't undo an earlier ambiguous one.
+        attempts = row["attempts"] + (retry_after is None)
+        status = "uncertain" if uncertain or row["status"] == "uncertain" else "pending"
+        if attempts >= Config.HOM_GITHUB_ISSUE_MAX_ATTEMPTS:
+            await self._fail_issue(row, error)
             return
 
-        payload = response.json()
-        issue_number = payload["number"]
-        issue_url = payload["html_url"]
+        delay = retry_after if retry_after is not None else backoff(attempts, base=5.0, cap=600.0)
+        await self.bot.db.execute(
+            """
+            UPDATE github_issue_outbox
+            SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+            """,
+            (status, attempts, time.time() + delay, error, row["id"]),
+        )
+
+    async def _fail_issue(self, row: sqlite3.Row, error: str) -> None:
+        await self.bot.db.execute(
+            "UPDATE github_issue_outbox SET status = 'failed', last_error = ? WHERE id = ?",
+            (error, row["id"]),
+        )
+
+        # The job is settled at this point, a failure to report it must not reopen it.
+        if guild := self.bot.get_guild(row["guild_id"]):
+            try:
+                await utils.send_log_message_to_guild(
+                    guild,
+                    (
+                        f"Repository: `{row['repository']}`\n"
+                        f"Title: `{row['title']}`{_source_message_line(row)}\n"
+                        f"{error}"
+                    ),
+                    title="Failed to create GitHub Issue",
+                    mod=guild.get_member(row["created_by_id"]),
+                )
+            except discord.HTTPException:
+                traceback.print_exc()
+
+    async def _try_announce_issue(self, job_id: int) -> None:
+        # The issue exists at this point, a failure here must never send the job back
+        # through the retry path. Unannounced issues are picked up again on restart.
+        try:
+            await self._announce_issue(job_id)
+        except Exception:
+            traceback.print_exc()
+
+    async def _announce_issue(self, job_id: int) -> None:
+        row = await self.bot.db.fetchone(
+            "SELECT * FROM github_issue_outbox WHERE id = ?", (job_id,)
+        )
+        if row is None:
+            return
 
         embed = discord.Embed(
             title="GitHub issue created",
             color=Constants.GREEN,
-            description=f"[#{issue_number}]({issue_url}) {cleaned_title}",
+            description=f"[#{row['issue_number']}]({row['issue_url']}) {row['title']}",
         )
-        embed.add_field(name="Repository", value=repository, inline=False)
-        if source_message is not None:
+        embed.add_field(name="Repository", value=row["repository"], inline=False)
+        if row["source_message_id"] is not None:
             embed.add_field(
                 name="Source message",
-                value=f"[Open message]({source_message.jump_url})",
+                value=f"[Open message]({_source_message_url(row)})",
                 inline=False,
             )
-        if image is not None:
-            embed.add_field(name="Image", value=f"[{image.filename}]({image.url})", inline=False)
-        embed.add_field(
-            name="Created by",
-            value=_get_actor_display_name(interaction.user),
-            inline=False,
-        )
+        if row["image_url"] is not None:
+            embed.add_field(
+                name="Image", value=f"[{row['image_filename']}]({row['image_url']})", inline=False
+            )
+        embed.add_field(name="Created by", value=row["created_by_name"], inline=False)
 
-        if public_success_response:
-            if source_message is not None:
-                try:
-                    await source_message.reply(embed=embed, mention_author=False)
-                    await interaction.delete_original_response()
-                except discord.HTTPException:
-                    await interaction.edit_original_response(
-                        content=(
-                            "GitHub issue was created, but I couldn't post the public reply.\n"
-                            f"[#{issue_number}]({issue_url}) {cleaned_title}"
-                        ),
-                    )
+        channel = self.bot.get_partial_messageable(row["channel_id"], guild_id=row["guild_id"])
+        try:
+            if row["source_message_id"] is not None:
+                await channel.get_partial_message(row["source_message_id"]).reply(
+                    embed=embed, mention_author=False
+                )
             else:
-                try:
-                    channel = t.cast(discord.abc.Messageable, interaction.channel)
-                    await channel.send(embed=embed)
-                    await interaction.delete_original_response()
-                except (AttributeError, discord.HTTPException):
-                    await interaction.edit_original_response(
-                        content=(
-                            "GitHub issue was created, but I couldn't post the public message.\n"
-                            f"[#{issue_number}]({issue_url}) {cleaned_title}"
-                        ),
-                    )
-        else:
-            await interaction.followup.send(embed=embed, ephemeral=True)
+                await channel.send(embed=embed)
+        except discord.HTTPException:
+            # The source message may be gone by now, the mod log below still links the issue.
+            pass
 
-        source_message_line = (
-            f"\nSource message: {source_message.jump_url}" if source_message is not None else ""
-        )
-        await utils.send_log_message(
-            interaction,
-            (
-                f"Issue: [#{issue_number}]({issue_url})\n"
-                f"Repository: `{repository}`\n"
-                f"Title: `{cleaned_title}`{source_message_line}"
-            ),
-            title="Created GitHub Issue",
-            mod=interaction.user,
+        await self.bot.db.execute(
+            "UPDATE github_issue_outbox SET status = 'done' WHERE id = ?", (job_id,)
         )
 
+        if guild := self.bot.get_guild(row["guild_id"]):
+            try:
+                await utils.send_log_message_to_guild(
+                    guild,
+                    (
+                        f"Issue: [#{row['issue_number']}]({row['issue_url']})\n"
+                        f"Repository: `{row['repository']}`\n"
+                        f"Title: `{row['title']}`{_source_message_line(row)}"
+                    ),
+                    title="Created GitHub Issue",
+                    mod=guild.get_member(row["created_by_id"]),
+                )
+            except discord.HTTPException:
+                traceback.print_exc()
+
     @app_commands.guild_only()  # type: ignore[arg-type]
     @app_commands.describe(
         repository="The GitHub repository to create the issue in.",
@@ -580,7 +596,7 @@ class GitHub(commands.GroupCog, name="github"):
             return
 
         try:
-            _get_app_jwt()
+            await self.bot.github.ensure_configured()
         except GitHubAppAuthError as exc:
             await interaction.response.send_message(
                 str(exc),
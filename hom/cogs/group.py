@@ -8,6 +8,7 @@ from hom import utils
 from hom.bot import Bot
 from hom.config import Config
 from hom.config import Constants
+from hom.tickets import tickets
 from hom.utils import ViewT
 
 _GROUP_ID_LINK_PATTERN = re.compile(r"\[(?P<group_id>\d+)\]\(")
@@ -67,27 +68,13 @@ async def _build_group_lookup_permission_message(
     if not isinstance(interaction.channel, discord.TextChannel):
         return message
 
-    if interaction.client.user is None:
+    if (
+        message_id := tickets.get_instructions(interaction.channel.id, interaction.user.id)
+    ) is None:
         return message
 
-    async for channel_message in interaction.channel.history(limit=None):
-        if channel_message.author.id != interaction.client.user.id:
-            continue
-
-        if not channel_message.embeds:
-            continue
-
-        if not any(
-            mentioned_user.id == interaction.user.id for mentioned_user in channel_message.mentions
-        ):
-            continue
-
-        return (
-            f"{message}\n"
-            f"If you haven't already, please follow these instructions: {channel_message.jump_url}"
-        )
-
-    return message
+    jump_url = interaction.channel.get_partial_message(message_id).jump_url
+    return f"{message}\nIf you haven't already, please follow these instructions: {jump_url}"
 
 
 class GroupIdModal(discord.ui.Modal, title="Group Lookup"):
@@ -123,13 +110,13 @@ class GroupIdModal(discord.ui.Modal, title="Group Lookup"):
             colour=discord.Colour.blue(),
             url=f"{Config.HOM_BASE_WEBSITE_URL}/groups/{group_id}",
         )
-        embed.add_field(name="ID", value=str(data["id"]))
-        embed.add_field(name="Name", value=str(data["name"]))
-        embed.add_field(name="Total Members", value=str(data["memberCount"]))
+        embed.add_field(name="ID", value=str(data.id))
+        embed.add_field(name="Name", value=data.name)
+        embed.add_field(name="Total Members", value=str(data.member_count))
         leaders = [
-            membership["player"]["displayName"]
-            for membership in data["memberships"]
-            if membership["role"] in ("owner", "deputy_owner")
+            membership.player.display_name
+            for membership in data.memberships
+            if membership.is_leader
         ]
 
         embed.add_field(name="Leaders", value="\n".join(leaders), inline=False)
@@ -158,6 +145,12 @@ class GroupIdModal(discord.ui.Modal, title="Group Lookup"):
 
         await interaction.followup.send(embed=embed, view=ApproveDenyGroupRequest(group_id))
 
+    async def on_error(  # type: ignore[override]
+        self, interaction: discord.Interaction[t.Any], error: Exception
+    ) -> None:
+        if not await utils.handle_wom_error(interaction, error):
+            await super().on_error(interaction, error)
+
 
 class PlayerGroupModal(discord.ui.Modal, title="Player Lookup"):
     rsn: discord.ui.TextInput["PlayerGroupModal"] = discord.ui.TextInput(
@@ -196,7 +189,7 @@ class PlayerGroupModal(discord.ui.Modal, title="Player Lookup"):
             await interaction.followup.send(embed=embed)
             return
 
-        usernames = [membership["player"]["username"] for membership in data["memberships"]]
+        usernames = [membership.player.username for membership in data.memberships]
         normalized_rsn = rsn.lower().replace("_", " ").replace("-", " ")
         if any(username.lower() == normalized_rsn for username in usernames):
             embed = discord.Embed(title="Player Group Lookup", colour=discord.Colour.green())
@@ -205,10 +198,10 @@ class PlayerGroupModal(discord.ui.Modal, title="Player Lookup"):
                 name="Username",
                 value=f"[{rsn}]({Config.HOM_BASE_WEBSITE_URL}/players/{quote(rsn)})",
             )
-            embed.add_field(name="Group", value=str(data["name"]))
+            embed.add_field(name="Group", value=data.name)
             embed.add_field(
                 name="Group ID",
-                value=(f"[{data['id']}]" f"({Config.HOM_BASE_WEBSITE_URL}/groups/{data['id']})"),
+                value=f"[{data.id}]({Config.HOM_BASE_WEBSITE_URL}/groups/{data.id})",
             )
             embed.set_footer(text="The buttons below are for admin use only.")
 
@@ -217,7 +210,7 @@ class PlayerGroupModal(discord.ui.Modal, title="Player Lookup"):
                 view=ApproveDenyPlayerRemoveRequest(
                     rsn=rsn,
                     group_id=group_id,
-                    group_name=str(data["name"]),
+                    group_name=data.name,
                 ),
             )
             return
@@ -229,11 +222,17 @@ class PlayerGroupModal(discord.ui.Modal, title="Player Lookup"):
         )
         embed.add_field(
             name=f"{rsn} not found in group",
-            value=f"{data['name']} ({data['id']})",
+            value=f"{data.name} ({data.id})",
         )
         embed.set_footer(text="Please verify you have typed the correct RSN and Group ID.")
         await interaction.followup.send(embed=embed)
 
+    async def on_error(  # type: ignore[override]
+        self, interaction: discord.Interaction[t.Any], error: Exception
+    ) -> None:
+        if not await utils.handle_wom_error(interaction, error):
+            await super().on_error(interaction, error)
+
 
 class ApproveDenyPlayerRemoveRequest(discord.ui.View):
     def __init__(self, rsn: str, group_id: str, group_name: str) -> None:
@@ -242,6 +241,15 @@ class ApproveDenyPlayerRemoveRequest(discord.ui.View):
         self.group_id = group_id
         self.group_name = group_name
 
+    async def on_error(
+        self,
+        interaction: discord.Interaction[t.Any],
+        error: Exception,
+        item: discord.ui.Item[t.Any],
+    ) -> None:
+        if not await utils.handle_wom_error(interaction, error):
+            await super().on_error(interaction, error, item)
+
     @discord.ui.button(
         emoji="\N{CLOCKWISE RIGHTWARDS AND LEFTWARDS OPEN CIRCLE ARROWS}",
         label="Remove Player From Group",
@@ -294,6 +302,15 @@ class ApproveDenyGroupRequest(discord.ui.View):
         super().__init__(timeout=None)
         self.group_id = group_id
 
+    async def on_error(
+        self,
+        interaction: discord.Interaction[t.Any],
+        error: Exception,
+        item: discord.ui.Item[t.Any],
+    ) -> None:
+        if not await utils.handle_wom_error(interaction, error):
+            await super().on_error(interaction, error, item)
+
     @discord.ui.button(
         emoji=Constants.COMPLETE,
         label="Verify Group",
@@ -354,7 +371,7 @@ class ApproveDenyGroupRequest(discord.ui.View):
 
         embed = discord.Embed(title="Group Verified", colour=discord.Colour.green())
         embed.add_field(name="ID", value=group_id)
-        embed.add_field(name="Group Name", value=str(data["name"]))
+        embed.add_field(name="Group Name", value=data.name)
         await utils.send_log_message(
             interaction,
             f"Group: [{group_id}]({Config.HOM_BASE_WEBSITE_URL}/groups/{group_id})\n"
@@ -425,7 +442,7 @@ class ApproveDenyGroupRequest(discord.ui.View):
         )
         embed = discord.Embed(title="Reset Group Code", colour=discord.Colour.green())
         embed.add_field(name="Group ID", value=group_id)
-        embed.add_field(name="Group Name", value=str(data["name"]))
+        embed.add_field(name="Group Name", value=data.name)
         embed.description = (
             "Verification code successfully reset. "
             f"A DM has been sent to {ticket_user.mention}."
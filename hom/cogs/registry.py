@@ -0,0 +1,77 @@
+import discord
+from discord.ext import commands
+
+from hom.bot import Bot
+from hom.registry import registry
+from hom.registry import ticket_index
+from hom.tickets import tickets
+
+__all__ = ("Registry",)
+
+
+class Registry(commands.Cog):
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        for guild in self.bot.guilds:
+            registry.resolve(guild)
+            ticket_index.rebuild(guild)
+
+        # Drop tickets that were deleted while we were offline.
+        for channel_id in tickets.channel_ids:
+            if self.bot.get_channel(channel_id) is None:
+                await tickets.remove(channel_id)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        registry.resolve(guild)
+        ticket_index.rebuild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        registry.resolve(guild)
+        ticket_index.rebuild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        registry.forget_guild(guild)
+        for channel in guild.channels:
+            ticket_index.remove_channel(channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        registry.set_channel(channel)
+        ticket_index.update_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(
+        self, _: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ) -> None:
+        # Changing a channel's type replaces the object discord.py keeps for it. Permission
+        # changes also come through here, e.g. when a ticket owner is removed from it.
+        registry.set_channel(after)
+        ticket_index.update_channel(after)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        registry.remove_channel(channel)
+        ticket_index.remove_channel(channel.id)
+        await tickets.remove(channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role) -> None:
+        registry.set_role(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, _: discord.Role, after: discord.Role) -> None:
+        registry.set_role(after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        registry.remove_role(role)
+
+
+async def setup(bot: Bot) -> None:
+    await bot.add_cog(Registry(bot))
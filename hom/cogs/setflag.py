@@ -1,3 +1,5 @@
+import typing as t
+
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -6,6 +8,7 @@ from hom import utils
 from hom.bot import Bot
 from hom.config import Config
 from hom.config import Constants
+from hom.countries import countries
 
 __all__ = ("SetFlag",)
 
@@ -15,6 +18,14 @@ class SetFlag(commands.Cog, name="setflag"):
         super().__init__()
         self.bot = bot
 
+    async def cog_app_command_error(
+        self,
+        interaction: discord.Interaction[t.Any],
+        error: app_commands.AppCommandError,
+    ) -> None:
+        if not await utils.handle_wom_error(interaction, error):
+            raise error
+
     @app_commands.guild_only()  # type: ignore
     @app_commands.describe(
         username="Your in-game username.", country="Country name. Start typing to search."
@@ -31,6 +42,8 @@ class SetFlag(commands.Cog, name="setflag"):
         if not channel:
             await interaction.followup.send("Couldn't find change-flag channel, this is a bug.")
         elif interaction.channel == channel:
+            # Accept names, codes and aliases typed out without picking a suggestion.
+            country = countries.resolve(country) or country
             country_name = utils.get_country_name(country)
             if country_name is None:
                 embed = discord.Embed(
@@ -40,9 +53,11 @@ class SetFlag(commands.Cog, name="setflag"):
                 await interaction.followup.send(embed=embed)
                 return None
 
-            response = utils.set_flag(username, country)
+            updated = await self.bot.wom.set_player_country(
+                username, country if country != "null" else None
+            )
             flag_emoji = utils.get_flag_emoji(country)
-            if response.status_code == 200:
+            if updated:
                 title = f"{flag_emoji} Player flag updated!"
                 if country == "null":
                     description = f"{interaction.user.mention} unset `{username}`'s country"
@@ -7,6 +7,7 @@ from discord.ext import commands
 
 from hom import utils
 from hom.bot import Bot
+from hom.cache import caches
 from hom.cogs import views
 from hom.config import Config
 from hom.config import Constants
@@ -45,6 +46,33 @@ class Support(commands.GroupCog, name="support"):
         await self.bot.tree.sync()
         await ctx.channel.send("Commands synced!")
 
+    @commands.has_role(Config.HOM_MOD_ROLE)
+    @commands.command(name="stats")
+    async def stats(self, ctx: commands.Context[commands.Bot]) -> None:
+        embed = discord.Embed(title="Stats", color=Constants.BLUE)
+        for name, cache in sorted(caches.items()):
+            embed.add_field(
+                name=name,
+                value=(
+                    f"Entries: `{len(cache)}/{cache.maxsize}`\n"
+                    f"Hits: `{cache.hits}`\nMisses: `{cache.misses}`\n"
+                    f"Hit Rate: `{cache.hit_rate:.0%}`"
+                ),
+            )
+
+        http_stats = self.bot.http_stats
+        embed.add_field(
+            name="connections",
+            value=(
+                f"Requests: `{http_stats.requests}`\nCreated: `{http_stats.created}`\n"
+                f"Reused: `{http_stats.reused}`\nReuse Rate: `{http_stats.reuse_rate:.0%}`\n"
+                f"DNS Lookups: `{http_stats.dns_lookups}`\n"
+                f"DNS Cache Hits: `{http_stats.dns_cache_hits}`"
+            ),
+        )
+
+        await ctx.channel.send(embed=embed)
+
     @app_commands.guild_only()  # type: ignore
     @app_commands.describe(channel="The channel to send the embed to.")
     @app_commands.command(
@@ -0,0 +1,214 @@
+import asyncio
+import datetime
+import sqlite3
+import time
+import traceback
+import typing as t
+
+import discord
+from discord.ext import commands
+
+from hom import utils
+from hom.bot import Bot
+from hom.config import Config
+from hom.ratelimit import backoff
+from hom.transcripts import TranscriptWriter
+
+__all__ = ("Transcripts",)
+
+_ARCHIVE_MAX_ATTEMPTS: t.Final[int] = 8
+# Seconds a queued archive waits for its channel to be deleted. Archives whose channel is
+# still around after that are dropped again.
+_ARCHIVE_HOLD: t.Final[float] = 60.0
+# Seconds the archiver waits before carrying on after an unexpected error.
+_ARCHIVER_ERROR_DELAY: t.Final[float] = 30.0
+
+
+def _is_ticket_channel(channel: t.Any) -> bool:
+    return (
+        isinstance(channel, discord.TextChannel)
+        and channel.category_id == Config.HOM_TICKET_CATEGORY
+    )
+
+
+class Transcripts(commands.Cog):
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.store = bot.transcripts
+        self._archive_queued = asyncio.Event()
+        self._archiver: t.Optional["asyncio.Task[None]"] = None
+
+    async def cog_load(self) -> None:
+        self._archiver = asyncio.create_task(self._process_archives())
+
+    async def cog_unload(self) -> None:
+        if self._archiver is not None:
+            self._archiver.cancel()
+
+    async def close_ticket(
+        self, channel: discord.TextChannel, content: str, mod: discord.Member
+    ) -> None:
+        # Tickets we haven't fully captured have to be read before the channel goes away,
+        # everything else is already on disk and the channel can be deleted right away.
+        complete = self.store.is_complete(channel.id) or await self._backfill(channel)
+
+        # Queue the archive while the channel still exists, so nothing that happens after
+        # the delete can lose the transcript. It is held back until the delete went through.
+        await self.store.schedule_archive(channel, content, mod.id, hold=_ARCHIVE_HOLD)
+
+        # Stop recording first, so the delete event doesn't discard messages we still need.
+        self.store.untrack(channel.id)
+        try:
+            await channel.delete()
+        except BaseException:
+            # Including connection errors and cancellation, the channel may well still exist.
+            await self.store.cancel_archive(channel.id)
+            await self.store.track(channel.id, complete=complete)
+            raise
+
+        await self.store.release_archive(channel.id)
+        self._archive_queued.set()
+
+    async def _process_archives(self) -> None:
+        await self.bot.wait_until_ready()
+
+        while True:
+            try:
+                await self._process_next_archive()
+            except Exception:
+                # A database error must not end the worker, nothing would restart it.
+                traceback.print_exc()
+                await asyncio.sleep(_ARCHIVER_ERROR_DELAY)
+
+    async def _process_next_archive(self) -> None:
+        self._archive_queued.clear()
+        row = await self.store.next_archive()
+        if row is None:
+            await self._archive_queued.wait()
+            return
+
+        if (delay := row["next_attempt_at"] - time.time()) > 0:
+            try:
+                await asyncio.wait_for(self._archive_queued.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+            return
+
+        # The hold ran out without the delete going through, e.g. we were stopped in between.
+        # The ticket is still open, so go back to recording it instead of archiving it.
+        if isinstance(channel := self.bot.get_channel(row["channel_id"]), discord.TextChannel):
+            await self.store.cancel_archive(channel.id)
+            await self._backfill(channel)
+            return
+
+        try:
+            await self._upload_archive(row)
+        except Exception:
+            traceback.print_exc()
+            attempts = row["attempts"] + 1
+            if attempts < _ARCHIVE_MAX_ATTEMPTS:
+                delay = backoff(attempts, base=5.0, cap=300.0)
+                await self.store.retry_archive(row["channel_id"], attempts, delay)
+                return
+
+            print(f"Giving up on the transcript of ticket {row['channel_name']}.")
+
+        await self.store.finish_archive(row["channel_id"])
+
+    async def _upload_archive(self, row: sqlite3.Row) -> None:
+        guild = self.bot.get_guild(row["guild_id"])
+        if (
+            guild is None
+            or (log_channel := utils.get_channel(guild, Config.HOM_MOD_LOG_CHANNEL)) is None
+        ):
+            # Possibly only until the guild is available again, let the retries handle it.
+            raise RuntimeError(
+                f"Could not find the mod log to archive ticket {row['channel_name']} to."
+            )
+
+        mod = guild.get_member(row["mod_id"]) if row["mod_id"] is not None else None
+        closed_at = datetime.datetime.fromtimestamp(row["closed_at"])
+        with TranscriptWriter() as transcript:
+            await self.store.write_transcript(row["channel_id"], transcript)
+            await utils.send_transcript_message(
+                log_channel,
+                utils.build_log_embed(row["content"], mod),
+                transcript,
+                row["channel_name"] + closed_at.strftime("_%Y_%m_%d_%Hh_%Mm_%Ss"),
+            )
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        # Catch up on whatever happened while we were offline, and start recording tickets
+        # that were opened before we began capturing them.
+        for guild in self.bot.guilds:
+            for channel in guild.text_channels:
+                if _is_ticket_channel(channel):
+                    await self._backfill(channel)
+
+        for channel_id in self.store.channels:
+            if self.bot.get_channel(channel_id) is None:
+                await self.store.forget(channel_id)
+
+    async def _backfill(self, channel: discord.TextChannel) -> bool:
+        after = await self.store.last_message_id(channel.id)
+        await self.store.track(channel.id, complete=False)
+        try:
+            async for message in channel.history(
+                limit=None,
+                after=discord.Object(after) if after is not None else None,
+                oldest_first=True,
+            ):
+                await self.store.record_message(message)
+        except discord.HTTPException:
+            # Leave the channel incomplete, closing it falls back to reading its history.
+            traceback.print_exc()
+            return False
+
+        await self.store.track(channel.id, complete=True)
+        return True
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        if _is_ticket_channel(channel):
+            await self.store.track(channel.id, complete=True)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        if self.store.is_tracked(channel.id):
+            await self.store.forget(channel.id)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        if self.store.is_tracked(message.channel.id):
+            await self.store.record_message(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        if not self.store.is_tracked(payload.channel_id):
+            return
+
+        # Embeds being resolved for links also come through as updates, skip those.
+        message = payload.message
+        previous = payload.cached_message
+        if message.edited_at is None or (
+            previous is not None and previous.clean_content == message.clean_content
+        ):
+            return
+
+        await self.store.record_edit(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        if self.store.is_tracked(payload.channel_id):
+            await self.store.record_deletes(payload.channel_id, (payload.message_id,))
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        if self.store.is_tracked(payload.channel_id):
+            await self.store.record_deletes(payload.channel_id, sorted(payload.message_ids))
+
+
+async def setup(bot: Bot) -> None:
+    await bot.add_cog(Transcripts(bot))
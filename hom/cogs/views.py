@@ -1,13 +1,13 @@
-import asyncio
-
 import discord
 from discord.ext import commands
 
 from hom import utils
 from hom.cogs.group import GroupIdModal
 from hom.cogs.group import PlayerGroupModal
+from hom.cogs.transcripts import Transcripts
 from hom.config import Config
 from hom.config import Constants
+from hom.deletions import deletions
 from hom.utils import ViewT
 
 __all__ = (
@@ -35,13 +35,12 @@ class Support(discord.ui.View):
     async def groups_instructions(
         self: ViewT, interaction: discord.Interaction[commands.Bot], _: discord.ui.Button[ViewT]
     ) -> None:
-        await interaction.response.send_message(
+        response = await interaction.response.send_message(
             view=SupportGroup(),
             content="What do you need assistance with?",
             ephemeral=True,
         )
-        await asyncio.sleep(15)
-        await (await interaction.original_response()).delete()
+        await deletions.schedule(interaction, response.message_id)
 
     @discord.ui.button(
         label="Competitions",
@@ -51,13 +50,12 @@ class Support(discord.ui.View):
     async def competitions_instructions(
         self: ViewT, interaction: discord.Interaction[commands.Bot], _: discord.ui.Button[ViewT]
     ) -> None:
-        await interaction.response.send_message(
+        response = await interaction.response.send_message(
             view=SupportCompetition(),
             content="What do you need assistance with?",
             ephemeral=True,
         )
-        await asyncio.sleep(15)
-        await (await interaction.original_response()).delete()
+        await deletions.schedule(interaction, response.message_id)
 
     @discord.ui.button(
         label="Players",
@@ -67,13 +65,12 @@ class Support(discord.ui.View):
     async def players_instructions(
         self: ViewT, interaction: discord.Interaction[commands.Bot], _: discord.ui.Button[ViewT]
     ) -> None:
-        await interaction.response.send_message(
+        response = await interaction.response.send_message(
             view=SupportPlayer(),
             content="What do you need assistance with?",
             ephemeral=True,
         )
-        await asyncio.sleep(15)
-        await (await interaction.original_response()).delete()
+        await deletions.schedule(interaction, response.message_id)
 
     @discord.ui.button(
         label="Patreon", style=discord.ButtonStyle.green, custom_id="persistent_view:patreon"
@@ -704,13 +701,9 @@ class SupportMessageCloseChannel(discord.ui.View):
         if user := await utils.get_user_by_original_message(interaction.channel):
             content += f"{user.display_name} - {user.mention}"
 
-        await utils.send_log_message(
-            interaction=interaction,
-            content=content,
-            mod=interaction.user,
-            channel=interaction.channel,
-        )
-        await interaction.channel.delete()
+        transcripts = interaction.client.get_cog("Transcripts")
+        assert isinstance(transcripts, Transcripts)
+        await transcripts.close_ticket(interaction.channel, content, interaction.user)
 
 
 class GroupRemove(discord.ui.View):
@@ -15,6 +15,16 @@ def _int(var: str) -> int:
     return int(environ[var])
 
 
+def _int_or(var: str, default: int) -> int:
+    value = environ.get(var, "").strip()
+    return int(value) if value else default
+
+
+def _float_or(var: str, default: float) -> float:
+    value = environ.get(var, "").strip()
+    return float(value) if value else default
+
+
 def _csv(var: str) -> t.Tuple[str, ...]:
     value = environ.get(var, "")
     return tuple(part.strip() for part in value.split(",") if part.strip())
@@ -61,11 +71,47 @@ class Config:
     HOM_BASE_API_URL: t.Final[str] = _container_host_url("HOM_BASE_API_URL")
     HOM_BASE_WEBSITE_URL: t.Final[str] = environ["HOM_BASE_WEBSITE_URL"]
     HOM_API_KEY: t.Final[str] = environ["HOM_API_KEY"]
+    HOM_HTTP_POOL_SIZE: t.Final[int] = _int_or("HOM_HTTP_POOL_SIZE", 100)
+    HOM_HTTP_POOL_SIZE_PER_HOST: t.Final[int] = _int_or("HOM_HTTP_POOL_SIZE_PER_HOST", 20)
+    HOM_HTTP_KEEPALIVE: t.Final[float] = _float_or("HOM_HTTP_KEEPALIVE", 60.0)
+    HOM_HTTP_DNS_TTL: t.Final[int] = _int_or("HOM_HTTP_DNS_TTL", 300)
+    HOM_HTTP_TIMEOUT: t.Final[float] = _float_or("HOM_HTTP_TIMEOUT", 30.0)
+    HOM_HTTP_CONNECT_TIMEOUT: t.Final[float] = _float_or("HOM_HTTP_CONNECT_TIMEOUT", 5.0)
+    HOM_WOM_TIMEOUT: t.Final[float] = _float_or("HOM_WOM_TIMEOUT", 10.0)
+    HOM_WOM_RATE_LIMIT: t.Final[float] = _float_or("HOM_WOM_RATE_LIMIT", 10.0)
+    HOM_WOM_RATE_BURST: t.Final[float] = _float_or("HOM_WOM_RATE_BURST", 20.0)
+    HOM_WOM_MAX_RETRIES: t.Final[int] = _int_or("HOM_WOM_MAX_RETRIES", 3)
+    HOM_WOM_BREAKER_THRESHOLD: t.Final[int] = _int_or("HOM_WOM_BREAKER_THRESHOLD", 5)
+    HOM_WOM_BREAKER_COOLDOWN: t.Final[float] = _float_or("HOM_WOM_BREAKER_COOLDOWN", 30.0)
+    HOM_WOM_BREAKER_SLOW_CALL: t.Final[float] = _float_or("HOM_WOM_BREAKER_SLOW_CALL", 8.0)
+    HOM_GROUP_CACHE_TTL: t.Final[float] = _float_or("HOM_GROUP_CACHE_TTL", 300.0)
+    HOM_GROUP_CACHE_SIZE: t.Final[int] = _int_or("HOM_GROUP_CACHE_SIZE", 128)
+    HOM_GROUP_CACHE_MAX_MEMBERS: t.Final[int] = _int_or("HOM_GROUP_CACHE_MAX_MEMBERS", 50_000)
+    HOM_COMPETITIONS_CACHE_TTL: t.Final[float] = _float_or("HOM_COMPETITIONS_CACHE_TTL", 60.0)
+    HOM_COMPETITIONS_CACHE_SIZE: t.Final[int] = _int_or("HOM_COMPETITIONS_CACHE_SIZE", 256)
+    HOM_AUTOCOMPLETE_DEBOUNCE: t.Final[float] = _float_or("HOM_AUTOCOMPLETE_DEBOUNCE", 0.3)
+    HOM_AUTOCOMPLETE_DEADLINE: t.Final[float] = _float_or("HOM_AUTOCOMPLETE_DEADLINE", 2.5)
+    HOM_COMPETITION_REMOVAL_CONCURRENCY: t.Final[int] = _int_or(
+        "HOM_COMPETITION_REMOVAL_CONCURRENCY", 5
+    )
+    HOM_COMPETITION_REMOVAL_RATE: t.Final[float] = _float_or("HOM_COMPETITION_REMOVAL_RATE", 5.0)
+    HOM_COMPETITION_REMOVAL_TIMEOUT: t.Final[float] = _float_or(
+        "HOM_COMPETITION_REMOVAL_TIMEOUT", 15.0
+    )
+    HOM_TRANSCRIPT_SPOOL_SIZE: t.Final[int] = _int_or("HOM_TRANSCRIPT_SPOOL_SIZE", 1024 * 1024)
+    HOM_TRANSCRIPT_COMPRESS_THRESHOLD: t.Final[int] = _int_or(
+        "HOM_TRANSCRIPT_COMPRESS_THRESHOLD", 1024 * 1024
+    )
     HOM_GITHUB_REPOSITORIES: t.Final[t.Tuple[str, ...]] = _csv("HOM_GITHUB_REPOSITORIES")
     HOM_GITHUB_APP_ID: t.Final[t.Optional[str]] = environ.get("HOM_GITHUB_APP_ID")
     HOM_GITHUB_PRIVATE_KEY_PATH: t.Final[t.Optional[str]] = environ.get(
         "HOM_GITHUB_PRIVATE_KEY_PATH"
     )
+    HOM_GITHUB_TOKEN_CACHE_PATH: t.Final[str] = (
+        environ.get("HOM_GITHUB_TOKEN_CACHE_PATH") or "data/github-tokens.json"
+    )
+    HOM_GITHUB_ISSUE_MAX_ATTEMPTS: t.Final[int] = _int_or("HOM_GITHUB_ISSUE_MAX_ATTEMPTS", 8)
+    HOM_DATABASE_PATH: t.Final[str] = environ.get("HOM_DATABASE_PATH") or "data/hom.sqlite3"
 
     def __init__(self) -> None:
         raise RuntimeError("Config should not be instantiated.")
@@ -134,7 +180,7 @@ class Constants:
         "Belize": "BZ",
         "Canada": "CA",
         "Cocos (Keeling) Islands": "CC",
-        "Congo": "CD",
+        "Congo (Democratic Republic of the)": "CD",
         "Central African Republic": "CF",
         "Congo": "CG",
         "Switzerland": "CH",
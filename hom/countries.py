@@ -0,0 +1,96 @@
+import typing as t
+
+from hom.config import Constants
+from hom.search import SearchIndex
+from hom.search import normalize
+
+__all__ = ("CountryIndex", "countries")
+
+# Other names people commonly search for, mapped to the country code they mean.
+_ALIASES: t.Final[t.Dict[str, str]] = {
+    "UK": "GB",
+    "Great Britain": "GB",
+    "Britain": "GB",
+    "USA": "US",
+    "United States": "US",
+    "America": "US",
+    "UAE": "AE",
+    "DRC": "CD",
+    "DR Congo": "CD",
+    "Democratic Republic of the Congo": "CD",
+    "South Korea": "KR",
+    "North Korea": "KP",
+    "Russia": "RU",
+    "Iran": "IR",
+    "Vietnam": "VN",
+    "Syria": "SY",
+    "Laos": "LA",
+    "Ivory Coast": "CI",
+    "Cape Verde": "CV",
+    "Czech Republic": "CZ",
+    "Holland": "NL",
+    "Vatican": "VA",
+    "Burma": "MM",
+    "Macedonia": "MK",
+    "Swaziland": "SZ",
+    "Turkiye": "TR",
+}
+
+# Codes without a regular flag emoji.
+_EMOJIS: t.Final[t.Dict[str, str]] = {
+    "null": ":flag_white:",
+    "GB_ENG": ":england:",
+    "GB_NIR": ":flag_gb:",
+    "GB_SCT": ":scotland:",
+    "GB_WLS": ":wales:",
+}
+
+# Fuzzy matches below this trigram similarity are too far off to suggest.
+_MIN_SIMILARITY: t.Final[float] = 0.3
+
+
+class CountryIndex:
+    # Everything flag autocomplete needs, precomputed once. Countries are searched by name,
+    # code and alias, shorter names ranking first among equally good matches.
+    __slots__ = ("_names", "_emojis", "_default", "_index")
+
+    def __init__(self, countries: t.Mapping[str, str], aliases: t.Mapping[str, str]) -> None:
+        self._names = {code: name for name, code in countries.items()}
+        self._emojis = {code: _EMOJIS.get(code, f":flag_{code.lower()}:") for code in self._names}
+        self._default = list(self._names)
+
+        terms = {code: [name] for code, name in self._names.items()}
+        for code, names in terms.items():
+            if code != "null":
+                names.append(code)
+
+        for alias, code in aliases.items():
+            if code in terms:
+                terms[code].append(alias)
+
+        ranked = sorted(self._names, key=lambda code: (len(self._names[code]), self._names[code]))
+        self._index: SearchIndex[str] = SearchIndex(
+            ((code, terms[code]) for code in ranked), min_similarity=_MIN_SIMILARITY
+        )
+
+    def name(self, code: str) -> t.Optional[str]:
+        return self._names.get(code)
+
+    def emoji(self, code: str) -> str:
+        return self._emojis.get(code) or f":flag_{code.lower()}:"
+
+    def resolve(self, value: str) -> t.Optional[str]:
+        # The code for a country name, code or alias typed out in full.
+        if value in self._names:
+            return value
+
+        return self._index.exact(value)
+
+    def search(self, query: str, limit: int = 25) -> t.List[str]:
+        if not normalize(query):
+            return self._default[:limit]
+
+        return self._index.search(query, limit)
+
+
+countries = CountryIndex(Constants.COUNTRIES, _ALIASES)
@@ -0,0 +1,159 @@
+import asyncio
+import heapq
+import time
+import traceback
+import typing as t
+
+import discord
+
+from hom.ratelimit import backoff
+from hom.storage import Database
+
+__all__ = ("DeletionScheduler", "deletions")
+
+# Interaction responses are deleted through the interaction's token, which Discord only
+# accepts for this long after the interaction was created.
+_INTERACTION_TOKEN_TTL: t.Final[float] = 15 * 60
+
+
+class _Deletion(t.NamedTuple):
+    delete_at: float
+    id: int
+    expires_at: float
+    application_id: int
+    token: str
+    message_id: int
+    attempts: int = 0
+
+
+class DeletionScheduler:
+    # Deletes interaction responses once their time is up. Handlers register a message and
+    # return right away, a single dispatcher works through a heap ordered by due time. The
+    # schedule is persisted so pending deletions survive a restart.
+    __slots__ = ("_db", "_client", "_heap", "_wakeup", "_dispatcher")
+
+    def __init__(self) -> None:
+        self._db: t.Optional[Database] = None
+        self._client: t.Optional[discord.Client] = None
+        self._heap: t.List[_Deletion] = []
+        self._wakeup: t.Optional[asyncio.Event] = None
+        self._dispatcher: t.Optional["asyncio.Task[None]"] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def load(self, db: Database, client: discord.Client) -> None:
+        self._db = db
+        self._client = client
+        self._wakeup = asyncio.Event()
+        rows = await db.fetchall(
+            """
+            SELECT delete_at, id, expires_at, application_id, token, message_id
+            FROM scheduled_deletions
+            """
+        )
+        self._heap = [_Deletion(*row) for row in rows]
+        heapq.heapify(self._heap)
+        self._ensure_dispatcher()
+
+    async def schedule(
+        self,
+        interaction: discord.Interaction[t.Any],
+        message_id: t.Optional[int] = None,
+        *,
+        delay: float = 15.0,
+    ) -> None:
+        # Without a message id the interaction's original response is deleted.
+        if message_id is None:
+            message_id = (await interaction.original_response()).id
+
+        expires_at = interaction.created_at.timestamp() + _INTERACTION_TOKEN_TTL
+        deletion = _Deletion(
+            time.time() + delay,
+            0,
+            expires_at,
+            interaction.application_id,
+            interaction.token,
+            message_id,
+        )
+        if self._db is not None:
+            row_id = await self._db.execute(
+                """
+                INSERT INTO scheduled_deletions
+                (delete_at, expires_at, application_id, token, message_id) VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    deletion.delete_at,
+                    deletion.expires_at,
+                    deletion.application_id,
+                    deletion.token,
+                    deletion.message_id,
+                ),
+            )
+            deletion = deletion._replace(id=row_id)
+
+        heapq.heappush(self._heap, deletion)
+        self._ensure_dispatcher()
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+        if self._heap and (self._dispatcher is None or self._dispatcher.done()):
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        assert self._wakeup is not None
+
+        while self._heap:
+            self._wakeup.clear()
+            if (delay := self._heap[0].delete_at - time.time()) > 0:
+                # Woken early whenever something is scheduled, it might be due sooner.
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            deletion = heapq.heappop(self._heap)
+            if await self._delete(deletion):
+                await self._forget(deletion)
+                continue
+
+            retry_at = time.time() + backoff(deletion.attempts, base=1.0, cap=60.0)
+            if retry_at >= deletion.expires_at:
+                await self._forget(deletion)
+                continue
+
+            heapq.heappush(
+                self._heap,
+                deletion._replace(delete_at=retry_at, attempts=deletion.attempts + 1),
+            )
+
+    async def _delete(self, deletion: _Deletion) -> bool:
+        # Returns whether the deletion is settled, either done or never going to succeed.
+        if deletion.expires_at <= time.time() or self._client is None:
+            return True
+
+        webhook = discord.Webhook.partial(
+            deletion.application_id, deletion.token, client=self._client
+        )
+        try:
+            await webhook.delete_message(deletion.message_id)
+        except (discord.NotFound, discord.Forbidden):
+            # Already dismissed by the user, or the token is no longer valid.
+            pass
+        except discord.HTTPException:
+            traceback.print_exc()
+            return False
+
+        return True
+
+    async def _forget(self, deletion: _Deletion) -> None:
+        if self._db is not None:
+            await self._db.execute("DELETE FROM scheduled_deletions WHERE id = ?", (deletion.id,))
+
+
+deletions = DeletionScheduler()
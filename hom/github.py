@@ -0,0 +1,518 @@
+import asyncio
+import json
+import os
+import time
+import traceback
+import typing as t
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+import aiohttp
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+
+from hom.cache import SingleFlight
+from hom.config import Config
+from hom.ratelimit import parse_rate_limit
+from hom.ratelimit import parse_retry_after
+
+__all__ = (
+    "GITHUB_APP_CONFIGURATION_MESSAGE",
+    "GitHubAppAuthError",
+    "GitHubClient",
+    "GitHubRequestError",
+)
+
+GITHUB_API_URL: t.Final[str] = "https://api.github.com"
+GITHUB_API_VERSION: t.Final[str] = "2022-11-28"
+GITHUB_APP_CONFIGURATION_MESSAGE: t.Final[str] = (
+    "GitHub issue creation is not configured yet. Set `HOM_GITHUB_APP_ID` and "
+    "`HOM_GITHUB_PRIVATE_KEY_PATH` first."
+)
+# GitHub accepts app JWTs for at most ten minutes, we refresh a minute before they expire.
+_APP_JWT_LIFETIME: t.Final[int] = 600
+_EXPIRY_MARGIN: t.Final[int] = 60
+# Installation tokens last an hour, the background refresher renews them this early.
+_REFRESH_MARGIN: t.Final[int] = 600
+# How far back through recently updated issues we look for one we may already have created.
+_FIND_ISSUE_PAGE_SIZE: t.Final[int] = 100
+_FIND_ISSUE_MAX_PAGES: t.Final[int] = 5
+
+
+class GitHubAppAuthError(RuntimeError):
+    pass
+
+
+class GitHubRequestError(RuntimeError):
+    def __init__(
+        self,
+        status: t.Optional[int],
+        message: str,
+        retry_after: t.Optional[float] = None,
+        *,
+        delivered: bool = True,
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+        # False when GitHub certainly didn't act on the request: we never reached it, or it
+        # refused the request because of a rate limit.
+        self.delivered = delivered
+
+    @property
+    def retryable(self) -> bool:
+        # Connection problems, server errors and rate limits are worth trying again later.
+        return self.status is None or self.status >= 500 or self.retry_after is not None
+
+    @property
+    def ambiguous(self) -> bool:
+        # A retryable failure after which the request may still have gone through.
+        return self.retryable and self.delivered
+
+
+def _read_private_key() -> RSAPrivateKey:
+    path_value = Config.HOM_GITHUB_PRIVATE_KEY_PATH
+    if not path_value:
+        raise GitHubAppAuthError(GITHUB_APP_CONFIGURATION_MESSAGE)
+
+    try:
+        pem = Path(path_value).expanduser().read_bytes().strip()
+    except OSError as exc:
+        raise GitHubAppAuthError(
+            "GitHub App authentication could not read the configured private key file "
+            f"at `{path_value}`.\n"
+            f"```{str(exc)[:1800]}```"
+        ) from exc
+
+    if not pem:
+        raise GitHubAppAuthError(
+            f"GitHub App authentication found an empty private key file at `{path_value}`."
+        )
+
+    try:
+        private_key = serialization.load_pem_private_key(pem, password=None)
+    except (TypeError, ValueError) as exc:
+        raise GitHubAppAuthError(
+            "GitHub App authentication could not parse the configured private key.\n"
+            f"```{str(exc)[:1800]}```"
+        ) from exc
+
+    if not isinstance(private_key, RSAPrivateKey):
+        raise GitHubAppAuthError("The configured GitHub App private key is not an RSA key.")
+
+    return private_key
+
+
+def _parse_github_timestamp(value: str) -> t.Optional[float]:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _get_error_message(status: int, payload_obj: t.Any, text: str) -> str:
+    if not isinstance(payload_obj, dict):
+        return text.strip() or f"GitHub returned HTTP {status}."
+
+    payload: t.Mapping[str, t.Any] = payload_obj
+    message = payload.get("message")
+    if isinstance(message, str) and message.strip():
+        return message
+
+    errors = payload.get("errors")
+    if isinstance(errors, list) and errors:
+        typed_errors = t.cast(t.Sequence[t.Any], errors)
+        details = ", ".join(str(error) for error in typed_errors[:3])
+        return f"GitHub returned validation errors: {details}"
+
+    return f"GitHub returned HTTP {status}."
+
+
+class _TokenCache(t.NamedTuple):
+    installation_ids: t.Dict[str, int]
+    installation_tokens: t.Dict[int, t.Tuple[str, float]]
+
+
+def _read_token_cache(path: str) -> _TokenCache:
+    cache = _TokenCache({}, {})
+    try:
+        payload = json.loads(Path(path).expanduser().read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return cache
+    except (OSError, ValueError):
+        traceback.print_exc()
+        return cache
+
+    if not isinstance(payload, dict):
+        return cache
+
+    installation_ids = payload.get("installation_ids")
+    if isinstance(installation_ids, dict):
+        cache.installation_ids.update(
+            (repository, installation_id)
+            for repository, installation_id in installation_ids.items()
+            if isinstance(installation_id, int)
+        )
+
+    installation_tokens = payload.get("installation_tokens")
+    if isinstance(installation_tokens, dict):
+        for installation_id, token in installation_tokens.items():
+            if (
+                isinstance(token, list)
+                and len(token) == 2
+                and isinstance(token[0], str)
+                and isinstance(token[1], (int, float))
+            ):
+                cache.installation_tokens[int(installation_id)] = (token[0], float(token[1]))
+
+    return cache
+
+
+def _write_token_cache(path: str, cache: _TokenCache) -> None:
+    target = Path(path).expanduser()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_name(f".{target.name}.tmp")
+    payload = json.dumps(
+        {
+            "installation_ids": cache.installation_ids,
+            "installation_tokens": {
+                str(installation_id): list(token)
+                for installation_id, token in cache.installation_tokens.items()
+            },
+        }
+    )
+
+    # The file holds live access tokens, only the bot's user may read it.
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, 0o600)
+
+        os.write(fd, payload.encode("utf-8"))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    os.replace(temporary, target)
+
+
+class GitHubClient:
+    def __init__(self, session: aiohttp.ClientSession, cache_path: t.Optional[str] = None) -> None:
+        self._session = session
+        self._cache_path = cache_path
+        # Replaces the session's timeout as a whole, so the connect limit is carried over.
+        self._timeout = aiohttp.ClientTimeout(total=15, connect=Config.HOM_HTTP_CONNECT_TIMEOUT)
+        self._private_key: t.Optional[RSAPrivateKey] = None
+        self._app_jwt: t.Optional[t.Tuple[str, float]] = None
+        self._installation_ids: t.Dict[str, int] = {}
+        self._installation_tokens: t.Dict[int, t.Tuple[str, float]] = {}
+        self._rate_limited_until = 0.0
+        self._installation_flights: SingleFlight[str, int] = SingleFlight()
+        self._token_flights: SingleFlight[int, str] = SingleFlight()
+        self._cache_lock = asyncio.Lock()
+
+    async def _load_private_key(self) -> RSAPrivateKey:
+        if self._private_key is None:
+            loop = asyncio.get_running_loop()
+            self._private_key = await loop.run_in_executor(None, _read_private_key)
+
+        return self._private_key
+
+    async def ensure_configured(self) -> None:
+        if not Config.HOM_GITHUB_APP_ID:
+            raise GitHubAppAuthError(GITHUB_APP_CONFIGURATION_MESSAGE)
+
+        await self._load_private_key()
+
+    async def get_app_jwt(self) -> str:
+        if self._app_jwt is not None and time.time() < self._app_jwt[1] - _EXPIRY_MARGIN:
+            return self._app_jwt[0]
+
+        await self.ensure_configured()
+        private_key = await self._load_private_key()
+        now = int(time.time())
+        expires_at = now + _APP_JWT_LIFETIME
+        payload = {
+            "iat": now - 60,
+            "exp": expires_at,
+            "iss": Config.HOM_GITHUB_APP_ID,
+        }
+
+        try:
+            # RS256 signing is CPU bound, keep it off the event loop.
+            token = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: jwt.encode(payload, private_key, algorithm="RS256")
+            )
+        except Exception as exc:
+            raise GitHubAppAuthError(
+                "GitHub App authentication could not generate a JWT from the configured "
+                "private key.\n"
+                f"```{str(exc)[:1800]}```"
+            ) from exc
+
+        self._app_jwt = (token, float(expires_at))
+        return token
+
+    @property
+    def retry_after(self) -> float:
+        # Seconds until GitHub's rate limit window resets, 0 if we aren't limited.
+        return max(0.0, self._rate_limited_until - time.monotonic())
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        token: str,
+        *,
+        action: str,
+        payload: t.Optional[t.Dict[str, t.Any]] = None,
+    ) -> t.Tuple[int, t.Any, str]:
+        if (retry_after := self.retry_after) > 0:
+            raise GitHubRequestError(
+                None,
+                f"GitHub rate limited us while {action}, retrying in {retry_after:.0f}s.",
+                retry_after,
+                delivered=False,
+            )
+
+        try:
+            async with self._session.request(
+                method,
+                f"{GITHUB_API_URL}{path}",
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "Authorization": f"Bearer {token}",
+                    "User-Agent": "Helpful Old Man Discord Bot",
+                    "X-GitHub-Api-Version": GITHUB_API_VERSION,
+                },
+                json=payload,
+                timeout=self._timeout,
+            ) as r:
+                text = await r.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            # Only a failed connection means the request was never sent, a timeout or a
+            # dropped connection may have happened after GitHub already handled it.
+            raise GitHubRequestError(
+                None,
+                f"GitHub could not be reached while {action}.\n```{str(exc)[:1800]}```",
+                delivered=not isinstance(exc, aiohttp.ClientConnectorError),
+            ) from exc
+
+        try:
+            payload_obj = json.loads(text) if text else None
+        except ValueError:
+            payload_obj = None
+
+        remaining, reset_after = parse_rate_limit(r.headers)
+        if remaining is not None and remaining <= 0 and reset_after is not None:
+            self._rate_limited_until = time.monotonic() + reset_after
+
+        if r.status in (403, 429) and (
+            (limited_for := parse_retry_after(r.headers.get("Retry-After"))) is not None
+            or remaining == 0
+        ):
+            if limited_for is not None:
+                self._rate_limited_until = max(
+                    self._rate_limited_until, time.monotonic() + limited_for
+                )
+
+            raise GitHubRequestError(
+                r.status,
+                f"GitHub rate limited us while {action}, retrying in {self.retry_after:.0f}s.",
+                self.retry_after,
+                delivered=False,
+            )
+
+        if r.status >= 500:
+            error_message = _get_error_message(r.status, payload_obj, text)
+            raise GitHubRequestError(
+                r.status,
+                f"GitHub had a problem while {action}.\n```{error_message[:1800]}```",
+            )
+
+        return r.status, payload_obj, text
+
+    async def get_installation_id(self, repository: str) -> int:
+        if (installation_id := self._installation_ids.get(repository)) is not None:
+            return installation_id
+
+        return await self._installation_flights.do(
+            repository, lambda: self._fetch_installation_id(repository)
+        )
+
+    async def _fetch_installation_id(self, repository: str) -> int:
+        status, payload_obj, text = await self._request(
+            "GET",
+            f"/repos/{repository}/installation",
+            await self.get_app_jwt(),
+            action="looking up the repository installation",
+        )
+
+        if status != 200:
+            error_message = _get_error_message(status, payload_obj, text)
+            raise GitHubAppAuthError(
+                "Could not find a GitHub App installation for the selected repository. "
+                "Make sure the app is installed on that repository.\n"
+                f"```{error_message[:1800]}```"
+            )
+
+        installation_id = payload_obj.get("id") if isinstance(payload_obj, dict) else None
+        if not isinstance(installation_id, int):
+            raise GitHubAppAuthError("GitHub returned an unexpected installation lookup response.")
+
+        self._installation_ids[repository] = installation_id
+        await self._save_cache()
+        return installation_id
+
+    async def get_installation_token(
+        self, repository: str, *, min_ttl: float = _EXPIRY_MARGIN
+    ) -> str:
+        # Returns a cached token unless it expires within `min_ttl` seconds.
+        installation_id = await self.get_installation_id(repository)
+
+        cached_token = self._installation_tokens.get(installation_id)
+        if cached_token is not None and time.time() < cached_token[1] - min_ttl:
+            return cached_token[0]
+
+        try:
+            return await self._token_flights.do(
+                installation_id, lambda: self._fetch_installation_token(installation_id)
+            )
+        except GitHubAppAuthError:
+            # The app may have been reinstalled under a new id, look it up again next time.
+            self._installation_ids.pop(repository, None)
+            raise
+
+    async def _fetch_installation_token(self, installation_id: int) -> str:
+        status, payload_obj, text = await self._request(
+            "POST",
+            f"/app/installations/{installation_id}/access_tokens",
+            await self.get_app_jwt(),
+            action="requesting an installation token",
+        )
+
+        if status != 201:
+            error_message = _get_error_message(status, payload_obj, text)
+            raise GitHubAppAuthError(
+                f"GitHub rejected the installation token request.\n```{error_message[:1800]}```"
+            )
+
+        if not isinstance(payload_obj, dict):
+            raise GitHubAppAuthError("GitHub returned an unexpected installation token response.")
+
+        token_payload = t.cast(t.Dict[str, t.Any], payload_obj)
+        token_value = token_payload.get("token")
+        expires_at_value = token_payload.get("expires_at")
+        if not isinstance(token_value, str) or not isinstance(expires_at_value, str):
+            raise GitHubAppAuthError("GitHub returned an unexpected installation token response.")
+
+        expiry_timestamp = _parse_github_timestamp(expires_at_value)
+        if expiry_timestamp is None:
+            expiry_timestamp = time.time() + 3600
+
+        self._installation_tokens[installation_id] = (token_value, expiry_timestamp)
+        await self._save_cache()
+        return token_value
+
+    async def refresh_installation_token(self, repository: str) -> float:
+        # Makes sure the repository has a token valid for at least the refresh margin and
+        # returns the timestamp at which it needs refreshing again.
+        await self.get_installation_token(repository, min_ttl=_REFRESH_MARGIN)
+        _, expires_at = self._installation_tokens[self._installation_ids[repository]]
+        return expires_at - _REFRESH_MARGIN
+
+    async def load_cache(self) -> None:
+        if self._cache_path is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, _read_token_cache, self._cache_path)
+        now = time.time()
+        self._installation_ids.update(cached.installation_ids)
+        self._installation_tokens.update(
+            (installation_id, token)
+            for installation_id, token in cached.installation_tokens.items()
+            if token[1] - _EXPIRY_MARGIN > now
+        )
+
+    async def _save_cache(self) -> None:
+        if self._cache_path is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._cache_lock:
+                cache = _TokenCache(dict(self._installation_ids), dict(self._installation_tokens))
+                await loop.run_in_executor(None, _write_token_cache, self._cache_path, cache)
+        except OSError:
+            # Losing the cache only costs a couple of extra requests after a restart.
+            traceback.print_exc()
+
+    async def create_issue(self, repository: str, title: str, body: str) -> t.Tuple[int, str]:
+        status, payload_obj, text = await self._request(
+            "POST",
+            f"/repos/{repository}/issues",
+            await self.get_installation_token(repository),
+            action=f"creating an issue in `{repository}`",
+            payload={"title": title, "body": body},
+        )
+
+        if status != 201 or not isinstance(payload_obj, dict):
+            error_message = _get_error_message(status, payload_obj, text)
+            raise GitHubRequestError(
+                status,
+                f"Failed to create an issue in `{repository}`.\n```{error_message[:1800]}```",
+            )
+
+        issue = t.cast(t.Dict[str, t.Any], payload_obj)
+        return int(issue["number"]), str(issue["html_url"])
+
+    async def find_issue(
+        self, repository: str, marker: str, since: float
+    ) -> t.Optional[t.Tuple[int, str]]:
+        # Looks for an issue created since `since` whose body contains `marker`. Issues are
+        # listed rather than searched for, the search index can lag behind by minutes.
+        token = await self.get_installation_token(repository)
+        updated_since = datetime.fromtimestamp(since, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        for page in range(1, _FIND_ISSUE_MAX_PAGES + 1):
+            query = urlencode(
+                {
+                    "state": "all",
+                    "since": updated_since,
+                    "sort": "created",
+                    "direction": "desc",
+                    "per_page": _FIND_ISSUE_PAGE_SIZE,
+                    "page": page,
+                }
+            )
+            status, payload_obj, text = await self._request(
+                "GET",
+                f"/repos/{repository}/issues?{query}",
+                token,
+                action=f"looking for an existing issue in `{repository}`",
+            )
+
+            if status != 200 or not isinstance(payload_obj, list):
+                error_message = _get_error_message(status, payload_obj, text)
+                raise GitHubRequestError(
+                    status,
+                    f"Failed to list the issues in `{repository}`.\n```{error_message[:1800]}```",
+                )
+
+            issues: t.List[t.Any] = payload_obj
+            for issue in issues:
+                if (
+                    isinstance(issue, dict)
+                    and "pull_request" not in issue
+                    and marker in str(issue.get("body") or "")
+                ):
+                    return int(issue["number"]), str(issue["html_url"])
+
+            if len(issues) < _FIND_ISSUE_PAGE_SIZE:
+                break
+
+        return None
@@ -0,0 +1,66 @@
+import typing as t
+
+import aiohttp
+
+from hom.config import Config
+
+__all__ = ("ConnectionStats", "create_session")
+
+
+class ConnectionStats:
+    # Counts how often requests got a fresh connection versus a pooled one, so we can
+    # confirm TLS handshakes and DNS lookups are being amortised.
+    __slots__ = ("requests", "created", "reused", "dns_lookups", "dns_cache_hits")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.created = 0
+        self.reused = 0
+        self.dns_lookups = 0
+        self.dns_cache_hits = 0
+
+    @property
+    def reuse_rate(self) -> float:
+        connections = self.created + self.reused
+        return self.reused / connections if connections else 0.0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(self._on_request_start)
+        config.on_connection_create_end.append(self._on_connection_create_end)
+        config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        config.on_dns_resolvehost_end.append(self._on_dns_resolvehost_end)
+        config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        return config
+
+    async def _on_request_start(self, *_: t.Any) -> None:
+        self.requests += 1
+
+    async def _on_connection_create_end(self, *_: t.Any) -> None:
+        self.created += 1
+
+    async def _on_connection_reuseconn(self, *_: t.Any) -> None:
+        self.reused += 1
+
+    async def _on_dns_resolvehost_end(self, *_: t.Any) -> None:
+        self.dns_lookups += 1
+
+    async def _on_dns_cache_hit(self, *_: t.Any) -> None:
+        self.dns_cache_hits += 1
+
+
+def create_session(stats: ConnectionStats) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=Config.HOM_HTTP_POOL_SIZE,
+        limit_per_host=Config.HOM_HTTP_POOL_SIZE_PER_HOST,
+        keepalive_timeout=Config.HOM_HTTP_KEEPALIVE,
+        use_dns_cache=True,
+        ttl_dns_cache=Config.HOM_HTTP_DNS_TTL,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(
+            total=Config.HOM_HTTP_TIMEOUT, connect=Config.HOM_HTTP_CONNECT_TIMEOUT
+        ),
+        trace_configs=[stats.trace_config()],
+    )
@@ -0,0 +1,106 @@
+import datetime
+import typing as t
+
+import msgspec
+
+__all__ = (
+    "Competition",
+    "CompetitionGroup",
+    "Group",
+    "Membership",
+    "ParticipationWithCompetition",
+    "Player",
+    "WomDecodeError",
+    "decode_group",
+    "decode_participations",
+)
+
+T = t.TypeVar("T")
+
+
+class WomDecodeError(ValueError):
+    pass
+
+
+# The models only declare the fields we read. Everything else in a payload is skipped by the
+# parser without ever being turned into Python objects, which is what keeps decoding a group
+# with thousands of members cheap.
+class Player(msgspec.Struct, frozen=True, rename="camel"):
+    username: str
+    display_name: str
+
+
+class Membership(msgspec.Struct, frozen=True, rename="camel"):
+    role: str
+    player: Player
+
+    @property
+    def is_leader(self) -> bool:
+        return self.role in ("owner", "deputy_owner")
+
+
+class Group(msgspec.Struct, frozen=True, rename="camel"):
+    id: int
+    name: str
+    member_count: int
+    memberships: t.Tuple[Membership, ...]
+
+
+class CompetitionGroup(msgspec.Struct, frozen=True, rename="camel"):
+    name: str
+
+
+class Competition(msgspec.Struct, frozen=True, rename="camel"):
+    id: int
+    title: str
+    group_id: t.Optional[int] = None
+    group: t.Optional[CompetitionGroup] = None
+    starts_at: t.Optional[datetime.datetime] = None
+    ends_at: t.Optional[datetime.datetime] = None
+
+    def __post_init__(self) -> None:
+        # Dates without an offset are in UTC.
+        for field in ("starts_at", "ends_at"):
+            value = getattr(self, field)
+            if value is not None and value.tzinfo is None:
+                msgspec.structs.force_setattr(
+                    self, field, value.replace(tzinfo=datetime.timezone.utc)
+                )
+
+    @property
+    def group_name(self) -> t.Optional[str]:
+        return self.group.name if self.group is not None else None
+
+
+class ParticipationWithCompetition(msgspec.Struct, frozen=True, rename="camel"):
+    competition_id: int
+    competition: Competition
+
+
+_group_decoder = msgspec.json.Decoder(Group)
+_participation_decoder = msgspec.json.Decoder(ParticipationWithCompetition)
+_raw_list_decoder = msgspec.json.Decoder(t.List[msgspec.Raw])
+
+
+def _decode(decoder: "msgspec.json.Decoder[T]", body: bytes) -> T:
+    try:
+        return decoder.decode(body)
+    except msgspec.DecodeError as exc:
+        # ValidationError is a DecodeError too, and carries the path of the offending field.
+        raise WomDecodeError(str(exc)) from None
+
+
+def decode_group(body: bytes) -> Group:
+    return _decode(_group_decoder, body)
+
+
+def decode_participations(body: bytes) -> t.List[ParticipationWithCompetition]:
+    # One malformed entry shouldn't hide the player's other competitions, it is skipped.
+    participations: t.List[ParticipationWithCompetition] = []
+    for entry in _decode(_raw_list_decoder, body):
+        try:
+            participations.append(_participation_decoder.decode(entry))
+        except msgspec.DecodeError as exc:
+            print(f"Skipping a malformed WOM participation: {exc}")
+
+    return participations
@@ -0,0 +1,172 @@
+import asyncio
+import email.utils
+import enum
+import heapq
+import itertools
+import random
+import time
+import typing as t
+
+__all__ = (
+    "Priority",
+    "RequestScheduler",
+    "TokenBucket",
+    "backoff",
+    "parse_rate_limit",
+    "parse_retry_after",
+)
+
+
+class TokenBucket:
+    # Hands out up to `rate` tokens per second with bursts of at most `capacity`.
+    # Waiters are served in arrival order.
+    __slots__ = ("rate", "capacity", "_tokens", "_updated", "_lock")
+
+    def __init__(self, rate: float, capacity: t.Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive.")
+
+        self.rate = rate
+        self.capacity = max(capacity if capacity is not None else rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    def release(self) -> None:
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+    def delay(self) -> float:
+        # Seconds until the next token is available.
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while not self.try_acquire():
+                await asyncio.sleep(self.delay())
+
+
+class Priority(enum.IntEnum):
+    # Lower values are dispatched first.
+    WRITE = 0
+    READ = 1
+
+
+class RequestScheduler:
+    # Requests wait in a priority queue and a single dispatcher task releases them as
+    # tokens become available. The dispatcher also holds everything back while the
+    # upstream API has told us to pause, e.g. through `Retry-After`.
+    __slots__ = ("_bucket", "_waiters", "_counter", "_paused_until", "_dispatcher")
+
+    def __init__(self, rate: float, capacity: t.Optional[float] = None) -> None:
+        self._bucket = TokenBucket(rate, capacity)
+        self._waiters: t.List[t.Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._counter = itertools.count()
+        self._paused_until = 0.0
+        self._dispatcher: t.Optional["asyncio.Task[None]"] = None
+
+    @property
+    def pending(self) -> int:
+        return sum(not waiter.done() for _, _, waiter in self._waiters)
+
+    async def acquire(self, priority: Priority = Priority.READ) -> None:
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        await waiter
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update(self, remaining: t.Optional[int], reset_after: t.Optional[float]) -> None:
+        if remaining is not None and remaining <= 0 and reset_after is not None:
+            self.pause(reset_after)
+
+    async def _dispatch(self) -> None:
+        while True:
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+
+            if not self._waiters:
+                return
+
+            if (paused := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(paused)
+                continue
+
+            if not self._bucket.try_acquire():
+                await asyncio.sleep(self._bucket.delay())
+                continue
+
+            # Waiters cancelled while we slept are skipped and the token goes to the next one.
+            while self._waiters:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if not waiter.done():
+                    waiter.set_result(None)
+                    break
+            else:
+                self._bucket.release()
+
+
+def parse_retry_after(value: t.Optional[str]) -> t.Optional[float]:
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def parse_rate_limit(headers: t.Mapping[str, str]) -> t.Tuple[t.Optional[int], t.Optional[float]]:
+    # Supports both the draft standard `RateLimit-*` headers and the legacy `X-RateLimit-*`
+    # ones, whose reset value is an epoch timestamp rather than a number of seconds.
+    remaining_value = headers.get("RateLimit-Remaining", headers.get("X-RateLimit-Remaining"))
+    reset_value = headers.get("RateLimit-Reset", headers.get("X-RateLimit-Reset"))
+
+    try:
+        remaining = int(remaining_value) if remaining_value is not None else None
+    except ValueError:
+        remaining = None
+
+    try:
+        reset = float(reset_value) if reset_value is not None else None
+    except ValueError:
+        reset = None
+
+    if reset is not None and reset > 1_000_000_000:
+        reset = max(0.0, reset - time.time())
+
+    return remaining, reset
+
+
+def backoff(attempt: int, *, base: float = 0.5, cap: float = 8.0) -> float:
+    # Exponential backoff with full jitter.
+    return random.uniform(0, min(cap, base * 2**attempt))
@@ -0,0 +1,136 @@
+import typing as t
+
+import discord
+
+from hom.config import Config
+
+__all__ = ("GuildRegistry", "TicketIndex", "registry", "ticket_index")
+
+
+class GuildRegistry:
+    # Direct references to the channels and roles the bot is configured with, keyed by
+    # guild and object id. Lookups for anything else, or anything not resolved yet, fall
+    # back to discord.py's own caches.
+    __slots__ = ("channel_ids", "role_ids", "_channels", "_roles")
+
+    def __init__(self, channel_ids: t.Iterable[int], role_ids: t.Iterable[int]) -> None:
+        self.channel_ids = frozenset(channel_ids)
+        self.role_ids = frozenset(role_ids)
+        self._channels: t.Dict[t.Tuple[int, int], discord.abc.GuildChannel] = {}
+        self._roles: t.Dict[t.Tuple[int, int], discord.Role] = {}
+
+    def resolve(self, guild: discord.Guild) -> None:
+        for channel_id in self.channel_ids:
+            if channel := guild.get_channel(channel_id):
+                self._channels[guild.id, channel_id] = channel
+            else:
+                self._channels.pop((guild.id, channel_id), None)
+
+        for role_id in self.role_ids:
+            if role := guild.get_role(role_id):
+                self._roles[guild.id, role_id] = role
+            else:
+                self._roles.pop((guild.id, role_id), None)
+
+    def forget_guild(self, guild: discord.Guild) -> None:
+        for key in [key for key in self._channels if key[0] == guild.id]:
+            del self._channels[key]
+
+        for key in [key for key in self._roles if key[0] == guild.id]:
+            del self._roles[key]
+
+    def set_channel(self, channel: discord.abc.GuildChannel) -> None:
+        if channel.id in self.channel_ids:
+            self._channels[channel.guild.id, channel.id] = channel
+
+    def remove_channel(self, channel: discord.abc.GuildChannel) -> None:
+        self._channels.pop((channel.guild.id, channel.id), None)
+
+    def set_role(self, role: discord.Role) -> None:
+        if role.id in self.role_ids:
+            self._roles[role.guild.id, role.id] = role
+
+    def remove_role(self, role: discord.Role) -> None:
+        self._roles.pop((role.guild.id, role.id), None)
+
+    def get_channel(
+        self, guild: discord.Guild, channel_id: int
+    ) -> t.Optional[discord.abc.GuildChannel]:
+        return self._channels.get((guild.id, channel_id)) or guild.get_channel(channel_id)
+
+    def get_role(self, guild: discord.Guild, role_id: int) -> t.Optional[discord.Role]:
+        return self._roles.get((guild.id, role_id)) or guild.get_role(role_id)
+
+
+registry = GuildRegistry(
+    channel_ids=(
+        Config.HOM_SUPPORT_CHANNEL,
+        Config.HOM_TICKET_CATEGORY,
+        Config.HOM_MOD_LOG_CHANNEL,
+        Config.HOM_PATREON_CHANNEL,
+        Config.HOM_QUESTIONS_CHANNEL,
+        Config.HOM_FLAG_CHANNEL,
+    ),
+    role_ids=(Config.HOM_MOD_ROLE, Config.HOM_GROUP_LEADER_ROLE),
+)
+
+
+class TicketIndex:
+    # Maps the members who were given access to a ticket channel, its owners, to that
+    # channel, so finding someone's open ticket doesn't need a scan over every ticket.
+    __slots__ = ("category_id", "_tickets", "_owners")
+
+    def __init__(self, category_id: int) -> None:
+        self.category_id = category_id
+        self._tickets: t.Dict[t.Tuple[int, int], t.Set[int]] = {}
+        self._owners: t.Dict[int, t.Tuple[int, t.FrozenSet[int]]] = {}
+
+    def rebuild(self, guild: discord.Guild) -> None:
+        for channel_id, (guild_id, _) in list(self._owners.items()):
+            if guild_id == guild.id:
+                self.remove_channel(channel_id)
+
+        for channel in guild.channels:
+            self.update_channel(channel)
+
+    def update_channel(self, channel: discord.abc.GuildChannel) -> None:
+        owners: t.FrozenSet[int] = frozenset()
+        if isinstance(channel, discord.TextChannel) and channel.category_id == self.category_id:
+            owners = frozenset(
+                target.id
+                for target, overwrite in channel.overwrites.items()
+                if overwrite.view_channel and _is_member_target(target)
+            )
+
+        self.remove_channel(channel.id)
+        if owners:
+            self._owners[channel.id] = (channel.guild.id, owners)
+            for user_id in owners:
+                self._tickets.setdefault((channel.guild.id, user_id), set()).add(channel.id)
+
+    def remove_channel(self, channel_id: int) -> None:
+        if (entry := self._owners.pop(channel_id, None)) is None:
+            return
+
+        guild_id, owners = entry
+        for user_id in owners:
+            channels = self._tickets.get((guild_id, user_id))
+            if channels is not None:
+                channels.discard(channel_id)
+                if not channels:
+                    del self._tickets[guild_id, user_id]
+
+    def get(self, guild_id: int, user_id: int) -> t.Optional[int]:
+        # The oldest ticket wins if someone somehow has more than one.
+        channels = self._tickets.get((guild_id, user_id))
+        return min(channels) if channels else None
+
+
+def _is_member_target(target: t.Union[discord.Role, discord.Member, discord.Object]) -> bool:
+    if isinstance(target, discord.Object):
+        return target.type is not discord.Role
+
+    return not isinstance(target, discord.Role)
+
+
+ticket_index = TicketIndex(Config.HOM_TICKET_CATEGORY)
@@ -0,0 +1,156 @@
+import bisect
+import itertools
+import re
+import typing as t
+import unicodedata
+
+__all__ = ("SearchIndex", "normalize", "trigrams")
+
+T = t.TypeVar("T")
+
+_NON_WORD_PATTERN = re.compile(r"[^a-z0-9]+")
+# Shorter queries only match at the start of a word, anywhere else they'd match almost anything.
+_MIN_SUBSTRING_LENGTH = 3
+
+
+def normalize(value: str) -> str:
+    # Case and accent insensitive, with punctuation collapsed into single spaces.
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD_PATTERN.sub(" ", ascii_only).strip()
+
+
+def trigrams(value: str) -> t.Set[str]:
+    padded = f"  {value} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _add(index: t.Dict[str, t.List[int]], key: str, item: int) -> None:
+    # Items are added in order, so a repeat can only ever be the last entry.
+    bucket = index.setdefault(key, [])
+    if not bucket or bucket[-1] != item:
+        bucket.append(item)
+
+
+class SearchIndex(t.Generic[T]):
+    # Ranks items by the terms they are known by: exact matches first, then terms starting
+    # with the query, then terms containing a word starting with it, then terms containing it
+    # anywhere, and finally trigram similarity to catch typos. Every prefix is indexed up
+    # front, and substrings are found as prefixes of the sorted suffixes. Ties keep the order
+    # the items were given in.
+    __slots__ = (
+        "min_similarity",
+        "_items",
+        "_exact",
+        "_prefixes",
+        "_words",
+        "_suffixes",
+        "_terms",
+        "_grams",
+    )
+
+    def __init__(
+        self, items: t.Iterable[t.Tuple[T, t.Iterable[str]]], *, min_similarity: float = 0.3
+    ) -> None:
+        self.min_similarity = min_similarity
+        self._items: t.List[T] = []
+        self._exact: t.Dict[str, t.List[int]] = {}
+        self._prefixes: t.Dict[str, t.List[int]] = {}
+        self._words: t.Dict[str, t.List[int]] = {}
+        self._suffixes: t.List[t.Tuple[str, int]] = []
+        self._terms: t.List[t.Tuple[int, int]] = []
+        self._grams: t.Dict[str, t.List[int]] = {}
+
+        for i, (item, terms) in enumerate(items):
+            self._items.append(item)
+            for term in filter(None, map(normalize, terms)):
+                _add(self._exact, term, i)
+                for end in range(1, len(term) + 1):
+                    _add(self._prefixes, term[:end], i)
+
+                words = term.split()
+                for word in words[1:]:
+                    for end in range(1, len(word) + 1):
+                        _add(self._words, word[:end], i)
+
+                # Suffixes starting inside a word, the rest are covered by the prefix tiers.
+                for start in range(1, len(term) - _MIN_SUBSTRING_LENGTH + 1):
+                    if term[start - 1] != " " and term[start] != " ":
+                        self._suffixes.append((term[start:], i))
+
+                # Longer words are matched on their own as well, so a typo in the second
+                # word of a name isn't drowned out by the rest of it.
+                self._add_grams(term, i)
+                if len(words) > 1:
+                    for word in words:
+                        if len(word) > 3:
+                            self._add_grams(word, i)
+
+        self._suffixes.sort()
+
+    def _add_grams(self, term: str, item: int) -> None:
+        grams = trigrams(term)
+        self._terms.append((item, len(grams)))
+        for gram in grams:
+            self._grams.setdefault(gram, []).append(len(self._terms) - 1)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def exact(self, query: str) -> t.Optional[T]:
+        matches = self._exact.get(normalize(query))
+        return self._items[matches[0]] if matches else None
+
+    def search(self, query: str, limit: int = 25) -> t.List[T]:
+        if not (normalized := normalize(query)):
+            return self._items[:limit]
+
+        results: t.Dict[int, None] = {}
+        tiers = (
+            self._exact.get(normalized, ()),
+            self._prefixes.get(normalized, ()),
+            self._words.get(normalized, ()),
+            self._substrings(normalized),
+        )
+        for tier in tiers:
+            results.update(dict.fromkeys(tier))
+            if len(results) >= limit:
+                break
+        else:
+            # A number that is off by a digit is a different id, not a typo.
+            if not normalized.isdigit():
+                results.update(dict.fromkeys(self._fuzzy(normalized)))
+
+        return [self._items[i] for i in itertools.islice(results, limit)]
+
+    def _substrings(self, query: str) -> t.Iterator[int]:
+        # Evaluated lazily, so it's skipped when the earlier tiers already filled the results.
+        if len(query) < _MIN_SUBSTRING_LENGTH:
+            return
+
+        matches: t.Set[int] = set()
+        for suffix, item in itertools.islice(
+            self._suffixes, bisect.bisect_left(self._suffixes, (query,)), None
+        ):
+            if not suffix.startswith(query):
+                break
+
+            matches.add(item)
+
+        yield from sorted(matches)
+
+    def _fuzzy(self, query: str) -> t.List[int]:
+        grams = trigrams(query)
+        shared: t.Dict[int, int] = {}
+        for gram in grams:
+            for term in self._grams.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+
+        scores: t.Dict[int, float] = {}
+        for term, count in shared.items():
+            item, size = self._terms[term]
+            similarity = count / (len(grams) + size - count)
+            if similarity >= self.min_similarity and similarity > scores.get(item, 0.0):
+                scores[item] = similarity
+
+        return sorted(scores, key=lambda item: (-scores[item], item))
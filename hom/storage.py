@@ -0,0 +1,171 @@
+import asyncio
+import functools
+import sqlite3
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+__all__ = ("Database",)
+
+T = t.TypeVar("T")
+
+# Statements are idempotent and run in order every time the database is opened.
+_SCHEMA: t.Final[t.Tuple[str, ...]] = (
+    """
+    CREATE TABLE IF NOT EXISTS github_issue_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        repository TEXT NOT NULL,
+        title TEXT NOT NULL,
+        body TEXT NOT NULL,
+        image_filename TEXT,
+        image_url TEXT,
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        source_message_id INTEGER,
+        created_by_id INTEGER NOT NULL,
+        created_by_name TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        issue_number INTEGER,
+        issue_url TEXT,
+        created_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS github_issue_outbox_pending
+    ON github_issue_outbox (status, next_attempt_at)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticket_channels (
+        channel_id INTEGER PRIMARY KEY,
+        complete INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticket_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        author_id INTEGER,
+        author_name TEXT,
+        content TEXT,
+        created_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ticket_messages_channel
+    ON ticket_messages (channel_id, created_at, id)
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS ticket_messages_created
+    ON ticket_messages (message_id) WHERE kind = 'create'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticket_archives (
+        channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        channel_name TEXT NOT NULL,
+        content TEXT NOT NULL,
+        mod_id INTEGER,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        closed_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticket_metadata (
+        channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        owner_id INTEGER NOT NULL,
+        original_message_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticket_instructions (
+        channel_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        PRIMARY KEY (channel_id, user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scheduled_deletions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        delete_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        application_id INTEGER NOT NULL,
+        token TEXT NOT NULL,
+        message_id INTEGER NOT NULL
+    )
+    """,
+)
+
+
+class Database:
+    # A single SQLite connection owned by a dedicated thread, every query is handed to
+    # that thread so the event loop never blocks on disk I/O.
+    __slots__ = ("path", "_executor", "_connection")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hom-db")
+        self._connection: t.Optional[sqlite3.Connection] = None
+
+    async def _run(self, func: t.Callable[..., T], *args: t.Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    def _connect(self) -> None:
+        Path(self.path).expanduser().parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            connection.execute(statement)
+
+        self._connection = connection
+
+    def _execute(self, sql: str, params: t.Sequence[t.Any]) -> sqlite3.Cursor:
+        if self._connection is None:
+            raise RuntimeError("The database has not been connected yet.")
+
+        return self._connection.execute(sql, params)
+
+    def _execute_lastrowid(self, sql: str, params: t.Sequence[t.Any]) -> int:
+        return self._execute(sql, params).lastrowid or 0
+
+    def _fetchone(self, sql: str, params: t.Sequence[t.Any]) -> t.Optional[sqlite3.Row]:
+        row: t.Optional[sqlite3.Row] = self._execute(sql, params).fetchone()
+        return row
+
+    def _fetchall(self, sql: str, params: t.Sequence[t.Any]) -> t.List[sqlite3.Row]:
+        return self._execute(sql, params).fetchall()
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def connect(self) -> None:
+        await self._run(self._connect)
+
+    async def execute(self, sql: str, params: t.Sequence[t.Any] = ()) -> int:
+        # Returns the rowid of the last inserted row, if any.
+        return await self._run(self._execute_lastrowid, sql, params)
+
+    async def fetchone(self, sql: str, params: t.Sequence[t.Any] = ()) -> t.Optional[sqlite3.Row]:
+        return await self._run(self._fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params: t.Sequence[t.Any] = ()) -> t.List[sqlite3.Row]:
+        return await self._run(self._fetchall, sql, params)
+
+    async def close(self) -> None:
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
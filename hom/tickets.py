@@ -0,0 +1,130 @@
+import time
+import typing as t
+
+from hom.storage import Database
+
+__all__ = ("TicketMetadata", "TicketStore", "tickets")
+
+
+class TicketMetadata(t.NamedTuple):
+    channel_id: int
+    guild_id: int
+    owner_id: int
+    original_message_id: int
+    topic: str
+    created_at: float
+    updated_at: float
+
+
+class TicketStore:
+    # Who opened each ticket and which message opened it, persisted so looking either up
+    # never needs to read the channel's history. Everything is kept in memory as well, the
+    # database is only written to. The latest instructions posted for each user are kept
+    # too, to point them back at them.
+    __slots__ = ("_db", "_tickets", "_instructions")
+
+    def __init__(self) -> None:
+        self._db: t.Optional[Database] = None
+        self._tickets: t.Dict[int, TicketMetadata] = {}
+        self._instructions: t.Dict[t.Tuple[int, int], int] = {}
+
+    async def load(self, db: Database) -> None:
+        self._db = db
+        rows = await db.fetchall(
+            """
+            SELECT channel_id, guild_id, owner_id, original_message_id, topic, created_at,
+            updated_at FROM ticket_metadata
+            """
+        )
+        self._tickets = {row["channel_id"]: TicketMetadata(*row) for row in rows}
+        rows = await db.fetchall("SELECT channel_id, user_id, message_id FROM ticket_instructions")
+        self._instructions = {
+            (row["channel_id"], row["user_id"]): row["message_id"] for row in rows
+        }
+
+    @property
+    def channel_ids(self) -> t.List[int]:
+        return list(self._tickets.keys() | {channel_id for channel_id, _ in self._instructions})
+
+    def get(self, channel_id: int) -> t.Optional[TicketMetadata]:
+        return self._tickets.get(channel_id)
+
+    async def add(
+        self,
+        channel_id: int,
+        guild_id: int,
+        owner_id: int,
+        original_message_id: int,
+        topic: str,
+        created_at: t.Optional[float] = None,
+    ) -> TicketMetadata:
+        now = time.time()
+        metadata = TicketMetadata(
+            channel_id,
+            guild_id,
+            owner_id,
+            original_message_id,
+            topic,
+            created_at if created_at is not None else now,
+            now,
+        )
+        self._tickets[channel_id] = metadata
+        await self._execute(
+            """
+            INSERT OR REPLACE INTO ticket_metadata
+            (channel_id, guild_id, owner_id, original_message_id, topic, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            metadata,
+        )
+        return metadata
+
+    async def update_topic(self, channel_id: int, topic: str) -> None:
+        if (metadata := self._tickets.get(channel_id)) is None:
+            return
+
+        self._tickets[channel_id] = metadata._replace(topic=topic, updated_at=time.time())
+        await self._execute(
+            "UPDATE ticket_metadata SET topic = ?, updated_at = ? WHERE channel_id = ?",
+            (topic, self._tickets[channel_id].updated_at, channel_id),
+        )
+
+    def get_instructions(self, channel_id: int, user_id: int) -> t.Optional[int]:
+        # Tickets from before instructions were recorded still have their opening message.
+        if (message_id := self._instructions.get((channel_id, user_id))) is not None:
+            return message_id
+
+        metadata = self._tickets.get(channel_id)
+        if metadata is not None and metadata.owner_id == user_id:
+            return metadata.original_message_id
+
+        return None
+
+    async def record_instructions(self, channel_id: int, user_id: int, message_id: int) -> None:
+        self._instructions[channel_id, user_id] = message_id
+        await self._execute(
+            """
+            INSERT OR REPLACE INTO ticket_instructions (channel_id, user_id, message_id)
+            VALUES (?, ?, ?)
+            """,
+            (channel_id, user_id, message_id),
+        )
+
+    async def remove(self, channel_id: int) -> None:
+        if keys := [key for key in self._instructions if key[0] == channel_id]:
+            for key in keys:
+                del self._instructions[key]
+
+            await self._execute(
+                "DELETE FROM ticket_instructions WHERE channel_id = ?", (channel_id,)
+            )
+
+        if self._tickets.pop(channel_id, None) is not None:
+            await self._execute("DELETE FROM ticket_metadata WHERE channel_id = ?", (channel_id,))
+
+    async def _execute(self, sql: str, params: t.Sequence[t.Any]) -> None:
+        if self._db is not None:
+            await self._db.execute(sql, params)
+
+
+tickets = TicketStore()
@@ -0,0 +1,411 @@
+import array
+import asyncio
+import datetime
+import io
+import sqlite3
+import tempfile
+import time
+import typing as t
+import zlib
+
+import discord
+
+from hom.config import Config
+from hom.storage import Database
+
+__all__ = ("SpooledBuffer", "TranscriptStore", "TranscriptWriter")
+
+# Discord allows at most ten attachments per message.
+_FILES_PER_MESSAGE: t.Final[int] = 10
+_CHUNK_SIZE: t.Final[int] = 64 * 1024
+# Room for the gzip header and trailer plus deflate's worst case expansion of a chunk.
+_CHUNK_OVERHEAD: t.Final[int] = 1024
+_TRANSCRIPT_PAGE_SIZE: t.Final[int] = 500
+
+
+class SpooledBuffer(io.RawIOBase):
+    # Keeps its contents in memory until they grow past `max_size` bytes, then moves them
+    # to an anonymous temporary file. Unlike `tempfile.SpooledTemporaryFile` this is an
+    # `io.IOBase` on every Python version, which `discord.File` requires to use it as-is.
+    def __init__(self, max_size: int) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self._file: t.BinaryIO = io.BytesIO()
+        self._spilled = False
+
+    @property
+    def spilled(self) -> bool:
+        return self._spilled
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data: t.Any) -> int:
+        written = self._file.write(data)
+        if not self._spilled and self._file.tell() > self.max_size:
+            self._rollover()
+
+        return written
+
+    def readinto(self, buffer: t.Any) -> int:
+        view = memoryview(buffer).cast("B")
+        data = self._file.read(len(view))
+        view[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+
+        super().close()
+
+    def _rollover(self) -> None:
+        memory = t.cast(io.BytesIO, self._file)
+        spilled = t.cast(t.BinaryIO, tempfile.TemporaryFile())
+        spilled.write(memory.getbuffer())
+        memory.close()
+        self._file = spilled
+        self._spilled = True
+
+
+class TranscriptWriter:
+    # Formats ticket messages straight into a spooled buffer, so transcripts are built in
+    # linear time and never held in memory twice.
+    __slots__ = ("buffer", "messages", "_ends", "_parts", "_minute", "_minute_label")
+
+    def __init__(self, spool_size: int = Config.HOM_TRANSCRIPT_SPOOL_SIZE) -> None:
+        self.buffer = SpooledBuffer(spool_size)
+        self.messages = 0
+        # End offset of every message, so uploads can be split without cutting one in half.
+        self._ends = array.array("q")
+        self._parts: t.List[SpooledBuffer] = []
+        self._minute = -1
+        self._minute_label = ""
+
+    def __enter__(self) -> "TranscriptWriter":
+        return self
+
+    def __exit__(self, *_: t.Any) -> None:
+        self.close()
+
+    def add_message(self, message: discord.Message) -> None:
+        self.add_entry(
+            message.created_at,
+            message.author.display_name,
+            message.author.id,
+            message.clean_content,
+        )
+
+    def add_entry(
+        self,
+        created_at: datetime.datetime,
+        author_name: str,
+        author_id: int,
+        content: str,
+        note: str = "",
+    ) -> None:
+        timestamp = int(created_at.timestamp())
+        # Tickets tend to have bursts of messages within the same minute.
+        if (minute := timestamp // 60) != self._minute:
+            self._minute = minute
+            self._minute_label = created_at.strftime("%b %d, %Y at %I:%M%p")
+
+        self.buffer.write(
+            (
+                f"{self._minute_label} <t:{timestamp}:F>\n"
+                f"{author_name.split('/')[0].strip()} - {author_id}{note}\n{content}\n\n"
+            ).encode("utf-8")
+        )
+        self.messages += 1
+        self._ends.append(self.buffer.tell())
+
+    @property
+    def size(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    async def to_file_batches(self, name: str, *, limit: int) -> t.List[t.List[discord.File]]:
+        # Returns the transcript as files no larger than `limit` bytes, grouped into batches
+        # that fit in a single message. Large transcripts are gzipped, and if that still
+        # doesn't fit they're split into numbered parts that each decompress on their own.
+        compress = self.size > Config.HOM_TRANSCRIPT_COMPRESS_THRESHOLD
+        if not compress and self.size <= limit:
+            parts = [self.buffer]
+        else:
+            loop = asyncio.get_running_loop()
+            parts = await loop.run_in_executor(None, self._split, limit, compress)
+            self._parts.extend(parts)
+
+        extension = ".txt.gz" if compress else ".txt"
+        batches: t.List[t.List[discord.File]] = []
+        batch_size = 0
+        for number, part in enumerate(parts, 1):
+            part_size = part.seek(0, io.SEEK_END)
+            part.seek(0)
+            # The upload limit is applied to the whole request, not per attachment.
+            if (
+                not batches
+                or len(batches[-1]) >= _FILES_PER_MESSAGE
+                or batch_size + part_size > limit
+            ):
+                batches.append([])
+                batch_size = 0
+
+            filename = f"{name}.part{number}{extension}" if len(parts) > 1 else name + extension
+            batches[-1].append(discord.File(t.cast(io.BufferedIOBase, part), filename=filename))
+            batch_size += part_size
+
+        return batches
+
+    def _split(self, limit: int, compress: bool) -> t.List[SpooledBuffer]:
+        parts: t.List[SpooledBuffer] = []
+        part = SpooledBuffer(self.buffer.max_size)
+        compressor = _new_compressor() if compress else None
+        self.buffer.seek(0)
+        start = 0
+
+        for end in self._chunk_ends(min(_CHUNK_SIZE, limit // 4)):
+            data = self.buffer.read(end - start) or b""
+            start = end
+            # Deflate never grows data by more than a few bytes per block, so the raw size of
+            # a chunk bounds what it adds to the part.
+            if part.tell() and part.tell() + len(data) + _CHUNK_OVERHEAD > limit:
+                if compressor is not None:
+                    part.write(compressor.flush(zlib.Z_FINISH))
+                    compressor = _new_compressor()
+
+                parts.append(part)
+                part = SpooledBuffer(self.buffer.max_size)
+
+            if compressor is not None:
+                part.write(compressor.compress(data))
+                part.write(compressor.flush(zlib.Z_SYNC_FLUSH))
+            else:
+                part.write(data)
+
+        if compressor is not None:
+            part.write(compressor.flush(zlib.Z_FINISH))
+
+        parts.append(part)
+        return parts
+
+    def _chunk_ends(self, chunk_size: int) -> t.Iterator[int]:
+        # Groups consecutive messages into chunks of roughly `chunk_size` bytes.
+        chunk_start = 0
+        previous = 0
+        for end in self._ends:
+            if previous > chunk_start and end - chunk_start > chunk_size:
+                yield previous
+                chunk_start = previous
+
+            previous = end
+
+        if previous > chunk_start:
+            yield previous
+
+    def close(self) -> None:
+        # `discord.File` stubs out `close` on buffers it doesn't own, bypass it.
+        for buffer in (self.buffer, *self._parts):
+            SpooledBuffer.close(buffer)
+
+
+def _new_compressor() -> "zlib._Compress":
+    # wbits of 16 + 15 writes a gzip header and trailer around the deflate stream.
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+class TranscriptStore:
+    # Ticket messages, edits and deletions are appended here as they arrive over the
+    # gateway, so closing a ticket doesn't have to crawl its history. A channel is only
+    # `complete` once everything it ever contained has been recorded, either because we
+    # saw it being created or because its history has been backfilled.
+    __slots__ = ("_db", "_channels")
+
+    def __init__(self, db: Database) -> None:
+        self._db = db
+        self._channels: t.Dict[int, bool] = {}
+
+    async def load(self) -> None:
+        rows = await self._db.fetchall("SELECT channel_id, complete FROM ticket_channels")
+        self._channels = {row["channel_id"]: bool(row["complete"]) for row in rows}
+
+    @property
+    def channels(self) -> t.List[int]:
+        return list(self._channels)
+
+    def is_tracked(self, channel_id: int) -> bool:
+        return channel_id in self._channels
+
+    def is_complete(self, channel_id: int) -> bool:
+        return self._channels.get(channel_id, False)
+
+    async def track(self, channel_id: int, *, complete: bool) -> None:
+        # Updated synchronously so events arriving right after are recorded too.
+        self._channels[channel_id] = complete
+        await self._db.execute(
+            "INSERT OR REPLACE INTO ticket_channels (channel_id, complete) VALUES (?, ?)",
+            (channel_id, int(complete)),
+        )
+
+    def untrack(self, channel_id: int) -> None:
+        self._channels.pop(channel_id, None)
+
+    async def forget(self, channel_id: int) -> None:
+        # Messages of a channel with a queued archive are left for the archiver.
+        self._channels.pop(channel_id, None)
+        await self._db.execute("DELETE FROM ticket_channels WHERE channel_id = ?", (channel_id,))
+        await self._db.execute(
+            """
+            DELETE FROM ticket_messages WHERE channel_id = ?
+            AND channel_id NOT IN (SELECT channel_id FROM ticket_archives)
+            """,
+            (channel_id,),
+        )
+
+    async def schedule_archive(
+        self,
+        channel: discord.TextChannel,
+        content: str,
+        mod_id: t.Optional[int],
+        *,
+        hold: float = 0.0,
+    ) -> None:
+        # Queues the transcript of a closed channel for the mod log. The recorded messages are
+        # kept until the archive has been uploaded. A held archive isn't picked up until it is
+        # released, or `hold` seconds have passed in case that never happens.
+        now = time.time()
+        await self._db.execute(
+            """
+            INSERT OR REPLACE INTO ticket_archives
+            (channel_id, guild_id, channel_name, content, mod_id, next_attempt_at, closed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (channel.id, channel.guild.id, channel.name, content, mod_id, now + hold, now),
+        )
+        await self._db.execute("DELETE FROM ticket_channels WHERE channel_id = ?", (channel.id,))
+
+    async def release_archive(self, channel_id: int) -> None:
+        await self._db.execute(
+            "UPDATE ticket_archives SET next_attempt_at = ? WHERE channel_id = ?",
+            (time.time(), channel_id),
+        )
+
+    async def cancel_archive(self, channel_id: int) -> None:
+        await self._db.execute("DELETE FROM ticket_archives WHERE channel_id = ?", (channel_id,))
+
+    async def next_archive(self) -> t.Optional[sqlite3.Row]:
+        return await self._db.fetchone(
+            "SELECT * FROM ticket_archives ORDER BY next_attempt_at, channel_id LIMIT 1"
+        )
+
+    async def retry_archive(self, channel_id: int, attempts: int, delay: float) -> None:
+        await self._db.execute(
+            "UPDATE ticket_archives SET attempts = ?, next_attempt_at = ? WHERE channel_id = ?",
+            (attempts, time.time() + delay, channel_id),
+        )
+
+    async def finish_archive(self, channel_id: int) -> None:
+        await self._db.execute("DELETE FROM ticket_archives WHERE channel_id = ?", (channel_id,))
+        await self._db.execute("DELETE FROM ticket_messages WHERE channel_id = ?", (channel_id,))
+
+    async def record_message(self, message: discord.Message) -> None:
+        await self._db.execute(
+            """
+            INSERT OR IGNORE INTO ticket_messages
+            (channel_id, message_id, kind, author_id, author_name, content, created_at)
+            VALUES (?, ?, 'create', ?, ?, ?, ?)
+            """,
+            (
+                message.channel.id,
+                message.id,
+                message.author.id,
+                message.author.display_name,
+                message.clean_content,
+                message.created_at.timestamp(),
+            ),
+        )
+
+    async def record_edit(self, message: discord.Message) -> None:
+        edited_at = message.edited_at or discord.utils.utcnow()
+        await self._db.execute(
+            """
+            INSERT INTO ticket_messages
+            (channel_id, message_id, kind, author_id, author_name, content, created_at)
+            VALUES (?, ?, 'edit', ?, ?, ?, ?)
+            """,
+            (
+                message.channel.id,
+                message.id,
+                message.author.id,
+                message.author.display_name,
+                message.clean_content,
+                edited_at.timestamp(),
+            ),
+        )
+
+    async def record_deletes(self, channel_id: int, message_ids: t.Iterable[int]) -> None:
+        deleted_at = discord.utils.utcnow().timestamp()
+        for message_id in message_ids:
+            await self._db.execute(
+                """
+                INSERT INTO ticket_messages (channel_id, message_id, kind, created_at)
+                VALUES (?, ?, 'delete', ?)
+                """,
+                (channel_id, message_id, deleted_at),
+            )
+
+    async def last_message_id(self, channel_id: int) -> t.Optional[int]:
+        row = await self._db.fetchone(
+            """
+            SELECT MAX(message_id) AS message_id FROM ticket_messages
+            WHERE channel_id = ? AND kind = 'create'
+            """,
+            (channel_id,),
+        )
+        return row["message_id"] if row is not None else None
+
+    async def write_transcript(self, channel_id: int, transcript: TranscriptWriter) -> None:
+        # Deletions only know the message id, the rest comes from the last recorded version.
+        messages: t.Dict[int, t.Tuple[str, int, str]] = {}
+        position: t.Tuple[float, int] = (-1.0, -1)
+        while rows := await self._db.fetchall(
+            """
+            SELECT * FROM ticket_messages
+            WHERE channel_id = ? AND (created_at, id) > (?, ?)
+            ORDER BY created_at, id LIMIT ?
+            """,
+            (channel_id, *position, _TRANSCRIPT_PAGE_SIZE),
+        ):
+            for row in rows:
+                created_at = datetime.datetime.fromtimestamp(
+                    row["created_at"], tz=datetime.timezone.utc
+                )
+                if row["kind"] == "delete":
+                    author_name, author_id, content = messages.get(
+                        row["message_id"], ("Unknown", 0, "")
+                    )
+                    transcript.add_entry(created_at, author_name, author_id, content, " (deleted)")
+                    continue
+
+                messages[row["message_id"]] = (
+                    row["author_name"],
+                    row["author_id"],
+                    row["content"],
+                )
+                note = " (edited)" if row["kind"] == "edit" else ""
+                transcript.add_entry(
+                    created_at, row["author_name"], row["author_id"], row["content"], note
+                )
+
+            position = (rows[-1]["created_at"], rows[-1]["id"])
@@ -1,20 +1,24 @@
-import asyncio
-import datetime
-import functools
-import io
-import traceback
 import typing as t
 
 import discord
-import requests
 from discord import app_commands
 from discord.ext import commands
 
 from hom.config import Config
 from hom.config import Constants
+from hom.countries import countries
+from hom.deletions import deletions
+from hom.models import WomDecodeError
+from hom.registry import registry
+from hom.registry import ticket_index
+from hom.tickets import tickets
+from hom.transcripts import TranscriptWriter
+from hom.wom import WomUnavailableError
 
 __all__ = (
-    "archive_channel_messages",
+    "build_api_degraded_embed",
+    "build_api_unexpected_response_embed",
+    "build_log_embed",
     "build_support_embed",
     "create_ticket_for_user",
     "get_category",
@@ -25,10 +29,12 @@ __all__ = (
     "get_role",
     "get_user_by_original_message",
     "get_user_ticket_channel",
+    "handle_wom_error",
     "mod_check",
     "send_log_message",
+    "send_log_message_to_guild",
+    "send_transcript_message",
     "set_flag_autocomplete",
-    "set_flag",
 )
 
 ViewT = t.TypeVar("ViewT", bound=discord.ui.View)
@@ -41,24 +47,26 @@ def _default_ticket_view() -> discord.ui.View:
     return SupportMessage()
 
 
-async def archive_channel_messages(channel: discord.TextChannel) -> str:
-    data = ""
-
-    try:
-        async for message in channel.history(limit=None, oldest_first=True):
-            datetime_info = datetime.datetime.strftime(message.created_at, "%b %d, %Y at %I:%M%p")
-            datetime_info_timestamp = f"<t:{str(message.created_at.timestamp()).split('.')[0]}:F>"
-            data += (
-                f"{datetime_info} {datetime_info_timestamp}\n"
-                f"{message.author.display_name.split('/')[0].strip()} - "
-                f"{message.author.id}\n{message.clean_content}\n\n"
-            )
+def build_api_degraded_embed(retry_after: float) -> discord.Embed:
+    return discord.Embed(
+        title="API Degraded",
+        color=Constants.ORANGE,
+        description=(
+            "The Wise Old Man API is having trouble right now, so this request was not sent.\n"
+            f"Please try again in about {max(int(retry_after), 1)} seconds."
+        ),
+    )
 
-    except:
-        traceback.print_exc()
-        pass
 
-    return data
+def build_api_unexpected_response_embed() -> discord.Embed:
+    return discord.Embed(
+        title="Unexpected API Response",
+        color=Constants.ORANGE,
+        description=(
+            "The Wise Old Man API sent back something we couldn't read.\n"
+            "Please try again later, or let a moderator know if this keeps happening."
+        ),
+    )
 
 
 def build_support_embed(guild: discord.Guild) -> discord.Embed:
@@ -112,8 +120,7 @@ async def create_ticket_for_user(
     if existing_ticket_channel:
         msg_content = f":envelope:  Click [here]({existing_ticket_channel.jump_url}) to view your open ticket."
         msg = await interaction.followup.send(content=msg_content, ephemeral=True, wait=True)
-        await asyncio.sleep(15)
-        await msg.delete()
+        await deletions.schedule(interaction, msg.id)
         return existing_ticket_channel
 
     channel_name = f"help-{interaction.user.display_name[:15]}"
@@ -143,6 +150,9 @@ async def create_ticket_for_user(
             ),
         },
     )
+    # Index it now rather than waiting for the gateway event, so a quick second click
+    # finds this ticket instead of opening another one.
+    ticket_index.update_channel(new_text_channel)
 
     content = (
         ":envelope:  We have created a support ticket for you, click [here]"
@@ -160,15 +170,27 @@ async def create_ticket_for_user(
     if example_url:
         file = discord.File(f"hom/assets/{example_url}", filename=example_url)
         embed.set_image(url=f"attachment://{example_url}")
-        await new_text_channel.send(
+        original_message = await new_text_channel.send(
             f"{interaction.user.mention}", embed=embed, view=ticket_view, file=file
         )
     else:
-        await new_text_channel.send(f"{interaction.user.mention}", embed=embed, view=ticket_view)
+        original_message = await new_text_channel.send(
+            f"{interaction.user.mention}", embed=embed, view=ticket_view
+        )
+
+    await tickets.add(
+        new_text_channel.id,
+        interaction.guild.id,
+        interaction.user.id,
+        original_message.id,
+        new_text_channel.topic or "",
+    )
+    await tickets.record_instructions(
+        new_text_channel.id, interaction.user.id, original_message.id
+    )
 
     msg = await interaction.followup.send(content, ephemeral=True, wait=True)
-    await asyncio.sleep(15)
-    await msg.delete()
+    await deletions.schedule(interaction, msg.id)
 
     log_content = (
         f"({new_text_channel.topic}) Ticket opened for user:\n``{interaction.user.display_name}`` "
@@ -181,78 +203,77 @@ async def create_ticket_for_user(
 
 
 def get_category(guild: discord.Guild, category_id: int) -> t.Optional[discord.CategoryChannel]:
-    # The builtin `next` short circuits as soon as it finds a match reducing iterations
-    return next((c for c in guild.categories if c.id == category_id), None)
+    category = registry.get_channel(guild, category_id)
+    return category if isinstance(category, discord.CategoryChannel) else None
 
 
 def get_channel(
     guild: t.Optional[discord.Guild], channel_id: int
 ) -> t.Optional[discord.TextChannel]:
-    return (
-        t.cast(
-            discord.TextChannel,
-            next((c for c in guild.channels if c.id == channel_id), None),
-        )
-        if guild
-        else None
-    )
+    return t.cast(discord.TextChannel, registry.get_channel(guild, channel_id)) if guild else None
 
 
 def get_country_name(country: str) -> t.Optional[str]:
-    for key, val in Constants.COUNTRIES.items():
-        if val == country:
-            return key
-
-    return None
+    return countries.name(country)
 
 
 def get_flag_emoji(country: str) -> str:
-    if country == "null":
-        flag_emoji = ":flag_white:"
-    elif country == "GB_ENG":
-        flag_emoji = ":england:"
-    elif country == "GB_NIR":
-        flag_emoji = ":flag_gb:"
-    elif country == "GB_SCT":
-        flag_emoji = ":scotland:"
-    elif country == "GB_WLS":
-        flag_emoji = ":wales:"
-    else:
-        flag_emoji = f":flag_{country.lower()}:"
-
-    return flag_emoji
+    return countries.emoji(country)
 
 
 async def get_original_message(
     channel: discord.TextChannel,
-) -> t.Optional[discord.Message]:
+) -> t.Optional[t.Union[discord.Message, discord.PartialMessage]]:
+    if metadata := tickets.get(channel.id):
+        return channel.get_partial_message(metadata.original_message_id)
+
+    return await _find_original_message(channel)
+
+
+async def _find_original_message(channel: discord.TextChannel) -> t.Optional[discord.Message]:
+    # Tickets opened before we kept their metadata, remember what we find for next time.
     messages = [message async for message in channel.history(limit=1, oldest_first=True)]
-    return messages[0] if messages else None
+    if not messages:
+        return None
+
+    message = messages[0]
+    if message.mentions:
+        await tickets.add(
+            channel.id,
+            channel.guild.id,
+            message.mentions[0].id,
+            message.id,
+            channel.topic or "",
+            message.created_at.timestamp(),
+        )
+
+    return message
 
 
 def get_role(guild: discord.Guild, role_id: int) -> t.Optional[discord.Role]:
-    return next((r for r in guild.roles if r.id == role_id), None)
+    return registry.get_role(guild, role_id)
 
 
 async def get_user_by_original_message(
     channel: discord.TextChannel,
 ) -> t.Optional[t.Union[discord.Member, discord.User]]:
-    messages = [message async for message in channel.history(limit=1, oldest_first=True)]
-    mentions = messages[0].mentions if messages else None
-    return mentions[0] if mentions else None
+    if (metadata := tickets.get(channel.id)) and (
+        member := channel.guild.get_member(metadata.owner_id)
+    ):
+        return member
+
+    # Either a legacy ticket or the owner has left, the original mention still resolves.
+    message = await _find_original_message(channel)
+    return message.mentions[0] if message and message.mentions else None
 
 
 def get_user_ticket_channel(
     guild: discord.Guild, user: t.Union[discord.User, discord.Member]
 ) -> t.Optional[discord.TextChannel]:
-    if category := get_category(guild, Config.HOM_TICKET_CATEGORY):
-        for channel in category.channels:
-            user_perms = channel.overwrites_for(user)
-
-            if user_perms.view_channel:
-                return t.cast(discord.TextChannel, channel)
+    if (channel_id := ticket_index.get(guild.id, user.id)) is None:
+        return None
 
-    return None
+    return t.cast(t.Optional[discord.TextChannel], guild.get_channel(channel_id))
 
 
 async def update_ticket_for_user(
@@ -261,18 +282,21 @@ async def update_ticket_for_user(
     button_label: t.Optional[str],
     example_url: t.Optional[str] = None,
     view: t.Optional[discord.ui.View] = None,
-) -> t.Optional[discord.Message]:
+) -> t.Optional[t.Union[discord.Message, discord.PartialMessage]]:
     assert interaction.guild
     assert isinstance(interaction.channel, discord.TextChannel)
 
-    if not (message := await get_original_message(interaction.channel)):
+    if not (message := await get_original_message(interaction.channel)) or not (
+        og_user := await get_user_by_original_message(interaction.channel)
+    ):
         await interaction.followup.send(
             f"{Constants.DENIED} Could not get original message.", ephemeral=True
         )
         return None
 
-    og_user = message.mentions[0]
-    await interaction.channel.edit(topic=button_label or "Unknown (This is a bug)")
+    topic = button_label or "Unknown (This is a bug)"
+    await interaction.channel.edit(topic=topic)
+    await tickets.update_topic(interaction.channel.id, topic)
     embed = discord.Embed(description=instructions, title=button_label)
     embed.set_footer(
         text=(
@@ -286,19 +310,21 @@ async def update_ticket_for_user(
         embed.set_image(url=f"attachment://{example_url}")
         await message.edit(embed=embed, attachments=[file])
         file = discord.File(f"hom/assets/{example_url}", filename=example_url)
-        await interaction.channel.send(
+        instructions_message = await interaction.channel.send(
             (f"Hey {og_user.mention}, please check the updated instructions."),
             embed=embed,
             view=ticket_view,
             file=file,
         )
     else:
-        await interaction.channel.send(
+        instructions_message = await interaction.channel.send(
             (f"Hey {og_user.mention}, please check the updated instructions."),
             embed=embed,
             view=ticket_view,
         )
 
+    await tickets.record_instructions(interaction.channel.id, og_user.id, instructions_message.id)
+
     await interaction.edit_original_response(content="Updated ticket for user.", view=None)
     log_content = (
         f"({interaction.channel.topic}) Ticket updated for user:\n``{interaction.user.display_name}`` "
@@ -310,6 +336,24 @@ async def update_ticket_for_user(
     return message
 
 
+async def handle_wom_error(interaction: discord.Interaction[t.Any], error: Exception) -> bool:
+    # Unwraps app command invoke errors too, returns whether the error was handled.
+    original = getattr(error, "original", error)
+    if isinstance(original, WomUnavailableError):
+        embed = build_api_degraded_embed(original.retry_after)
+    elif isinstance(original, WomDecodeError):
+        embed = build_api_unexpected_response_embed()
+    else:
+        return False
+
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    return True
+
+
 async def mod_check(interaction: discord.Interaction[commands.Bot]) -> bool:
     assert isinstance(interaction.user, discord.Member)
 
@@ -328,49 +372,54 @@ async def send_log_message(
     interaction: discord.Interaction[commands.Bot],
     content: str,
     mod: t.Union[discord.User, discord.ClientUser, discord.Member, None] = None,
-    channel: t.Optional[discord.TextChannel] = None,
     title: t.Optional[str] = None,
 ) -> t.Optional[discord.Message]:
     assert interaction.guild
+    return await send_log_message_to_guild(interaction.guild, content, mod=mod, title=title)
+
+
+async def send_log_message_to_guild(
+    guild: discord.Guild,
+    content: str,
+    mod: t.Union[discord.User, discord.ClientUser, discord.Member, None] = None,
+    title: t.Optional[str] = None,
+) -> t.Optional[discord.Message]:
+    if log_channel := get_channel(guild, Config.HOM_MOD_LOG_CHANNEL):
+        return await log_channel.send(embed=build_log_embed(content, mod, title))
+
+    return None
+
 
-    log_channel = get_channel(interaction.guild, Config.HOM_MOD_LOG_CHANNEL)
+def build_log_embed(
+    content: str,
+    mod: t.Union[discord.User, discord.ClientUser, discord.Member, None] = None,
+    title: t.Optional[str] = None,
+) -> discord.Embed:
     embed = discord.Embed(title=title, description=content)
     if mod:
         embed.set_footer(text=f"Mod: {mod.display_name}")
 
-    file: t.Optional[discord.File] = None
+    return embed
 
-    if channel:
-        archived_data = await archive_channel_messages(channel)
-        timestamp = datetime.datetime.now().strftime("_%Y_%m_%d_%Hh_%Mm_%Ss")
-        file_name = f"{channel}" + timestamp + ".txt"
-        buf = io.BytesIO(bytes(archived_data, "utf-8"))
-        file = discord.File(buf, filename=file_name)
 
-    if log_channel:
-        send = functools.partial(log_channel.send, embed=embed)
-        return await (send(file=file) if file else send())
+async def send_transcript_message(
+    log_channel: discord.TextChannel,
+    embed: discord.Embed,
+    transcript: TranscriptWriter,
+    name: str,
+) -> discord.Message:
+    batches = await transcript.to_file_batches(name, limit=log_channel.guild.filesize_limit)
+    message = await log_channel.send(embed=embed, files=batches[0])
+    for files in batches[1:]:
+        await log_channel.send(files=files)
 
-    return None
+    return message
 
 
 async def set_flag_autocomplete(
     interaction: discord.Interaction[commands.Bot], current: str
 ) -> t.List[app_commands.Choice[str]]:
-    countries = [
-        app_commands.Choice(name=country, value=Constants.COUNTRIES[country])
-        for country in Constants.COUNTRIES.keys()
-        if current.lower() in country.lower()
+    return [
+        app_commands.Choice(name=countries.name(code) or code, value=code)
+        for code in countries.search(current)
     ]
-    return countries[:25]
-
-
-def set_flag(username: str, country: str) -> requests.models.Response:
-    url = f"{Config.HOM_BASE_API_URL}/players/{username}/country"
-    headers = Constants.HEADERS
-    json = {
-        "country": country if country != "null" else None,
-        "adminPassword": Config.SHARED_ADMIN_PASSWORD,
-    }
-    response = requests.put(url, headers=headers, json=json)
-    return response
@@ -1,79 +1,351 @@
+import asyncio
+import enum
+import json
+import time
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import NamedTuple
 from typing import Optional
 from typing import Tuple
 from typing import Union
 
 import aiohttp
 
+from hom.cache import SingleFlight
+from hom.cache import TTLCache
 from hom.config import Config
 from hom.config import Constants
+from hom.models import Group
+from hom.models import ParticipationWithCompetition
+from hom.models import decode_group
+from hom.models import decode_participations
+from hom.ratelimit import Priority
+from hom.ratelimit import RequestScheduler
+from hom.ratelimit import backoff
+from hom.ratelimit import parse_rate_limit
+from hom.ratelimit import parse_retry_after
+
+__all__ = ("BreakerState", "CircuitBreaker", "WomClient", "WomUnavailableError")
+
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class WomUnavailableError(RuntimeError):
+    def __init__(self, family: str, retry_after: float) -> None:
+        super().__init__(f"The Wise Old Man {family} API is degraded, try again later.")
+        self.family = family
+        self.retry_after = retry_after
+
+
+class BreakerState(enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    # Trips open after `threshold` consecutive failures, where calls slower than `slow_call`
+    # seconds count as failures too. Once `cooldown` seconds have passed a single probe is
+    # let through, closing the breaker again if it succeeds and reopening it if it doesn't.
+    __slots__ = (
+        "family",
+        "threshold",
+        "cooldown",
+        "slow_call",
+        "state",
+        "failures",
+        "_opened_at",
+        "_probing",
+    )
+
+    def __init__(self, family: str, *, threshold: int, cooldown: float, slow_call: float) -> None:
+        self.family = family
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.slow_call = slow_call
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_call(self) -> None:
+        if self.state is BreakerState.CLOSED:
+            return
+
+        remaining = self._opened_at + self.cooldown - time.monotonic()
+        if self.state is BreakerState.OPEN and remaining <= 0:
+            self.state = BreakerState.HALF_OPEN
+
+        if self.state is BreakerState.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+
+        raise WomUnavailableError(self.family, max(remaining, 0.0))
+
+    def record_success(self, latency: float) -> None:
+        if latency > self.slow_call:
+            self.record_failure()
+            return
+
+        self._probing = False
+        self.failures = 0
+        self.state = BreakerState.CLOSED
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.state is BreakerState.HALF_OPEN or self.failures >= self.threshold:
+            self.state = BreakerState.OPEN
+            self._opened_at = time.monotonic()
+
+    def abandon(self) -> None:
+        # The call was cancelled before we learned anything, let another probe through.
+        self._probing = False
+
+
+def _group_key(group_id: Union[str, int]) -> str:
+    return str(group_id).strip()
+
+
+def _group_weight(group: Group) -> int:
+    return 1 + len(group.memberships)
+
+
+class _Response(NamedTuple):
+    status: int
+    body: bytes
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.body)
 
 
 class WomClient:
     def __init__(self, session: aiohttp.ClientSession) -> None:
         self._session = session
         self._base = Config.HOM_BASE_API_URL
+        self._headers = Constants.HEADERS
+        # Replaces the session's timeout as a whole, so the connect limit is carried over.
+        self._timeout = aiohttp.ClientTimeout(
+            total=Config.HOM_WOM_TIMEOUT, connect=Config.HOM_HTTP_CONNECT_TIMEOUT
+        )
+        self._scheduler = RequestScheduler(Config.HOM_WOM_RATE_LIMIT, Config.HOM_WOM_RATE_BURST)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._groups: TTLCache[str, Group] = TTLCache(
+            "groups",
+            ttl=Config.HOM_GROUP_CACHE_TTL,
+            maxsize=Config.HOM_GROUP_CACHE_SIZE,
+            maxweight=Config.HOM_GROUP_CACHE_MAX_MEMBERS,
+            weigh=_group_weight,
+        )
+        # Bumped on every group mutation so lookups that raced it don't cache stale data.
+        self._groups_epoch = 0
+        self._group_flights: SingleFlight[str, Optional[Group]] = SingleFlight()
+        self._competition_flights: SingleFlight[
+            str, Optional[List[ParticipationWithCompetition]]
+        ] = SingleFlight()
+
+    def breaker(self, path: str) -> CircuitBreaker:
+        # Endpoints are grouped into families by their first path segment, e.g. `groups`.
+        family = path.lstrip("/").split("/", 1)[0]
+        if (breaker := self._breakers.get(family)) is None:
+            breaker = self._breakers[family] = CircuitBreaker(
+                family,
+                threshold=Config.HOM_WOM_BREAKER_THRESHOLD,
+                cooldown=Config.HOM_WOM_BREAKER_COOLDOWN,
+                slow_call=Config.HOM_WOM_BREAKER_SLOW_CALL,
+            )
+
+        return breaker
 
-    async def get_group(self, group_id: Union[str, int]) -> Optional[Dict[str, Any]]:
-        async with self._session.get(
-            f"{self._base}/groups/{group_id}", headers=Constants.HEADERS
-        ) as r:
-            return await r.json() if r.status == 200 else None
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        priority: Priority,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ) -> _Response:
+        kwargs: Dict[str, Any] = {"headers": self._headers, "timeout": timeout or self._timeout}
+        if payload is not None:
+            kwargs["json"] = payload
 
-    async def get_player_competitions(self, username: str) -> Optional[List[Dict[str, Any]]]:
+        # The breaker sees one outcome per call, however many attempts the retries took.
+        breaker = self.breaker(path)
+        breaker.before_call()
         try:
-            async with self._session.get(
-                f"{self._base}/players/{username}/competitions",
-                headers=Constants.HEADERS,
-                timeout=aiohttp.ClientTimeout(total=10),
-            ) as r:
-                return await r.json() if r.status == 200 else None
-        except (aiohttp.ClientError, TimeoutError):
+            response, latency = await self._send(method, path, priority, kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.abandon()
+            raise
+
+        if response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success(latency)
+
+        return response
+
+    async def _send(
+        self, method: str, path: str, priority: Priority, kwargs: Dict[str, Any]
+    ) -> Tuple[_Response, float]:
+        # Returns the final response and how long its attempt took, backoff not included.
+        # A 429 means the request was never processed, so writes are retried too.
+        # Anything else is only retried for requests that are safe to repeat.
+        idempotent = method in _IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                await self._scheduler.acquire(priority)
+                started = time.monotonic()
+                async with self._session.request(method, f"{self._base}{path}", **kwargs) as r:
+                    response = _Response(r.status, await r.read())
+                    headers = r.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if not idempotent or attempt >= Config.HOM_WOM_MAX_RETRIES:
+                    raise
+
+                await asyncio.sleep(backoff(attempt))
+                attempt += 1
+                continue
+
+            latency = time.monotonic() - started
+            self._scheduler.update(*parse_rate_limit(headers))
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if response.status == 429 and retry_after is not None:
+                self._scheduler.pause(retry_after)
+
+            retryable = response.status == 429 or (
+                idempotent and response.status in _RETRY_STATUSES
+            )
+            if not retryable or attempt >= Config.HOM_WOM_MAX_RETRIES:
+                return response, latency
+
+            await asyncio.sleep(max(backoff(attempt), retry_after or 0.0))
+            attempt += 1
+
+    def invalidate_group(self, group_id: Union[str, int]) -> None:
+        key = _group_key(group_id)
+        self._groups_epoch += 1
+        self._groups.pop(key)
+        self._group_flights.forget(key)
+
+    async def get_group(self, group_id: Union[str, int]) -> Optional[Group]:
+        key = _group_key(group_id)
+        if (cached := self._groups.get(key)) is not None:
+            return cached
+
+        return await self._group_flights.do(key, lambda: self._fetch_group(key))
+
+    async def _fetch_group(self, key: str) -> Optional[Group]:
+        epoch = self._groups_epoch
+        response = await self._request("GET", f"/groups/{key}", priority=Priority.READ)
+        if response.status != 200:
+            return None
+
+        group = decode_group(response.body)
+        if epoch == self._groups_epoch:
+            self._groups.set(key, group)
+
+        return group
+
+    async def get_player_competitions(
+        self, username: str
+    ) -> Optional[List[ParticipationWithCompetition]]:
+        return await self._competition_flights.do(
+            username.strip().lower(), lambda: self._fetch_player_competitions(username)
+        )
+
+    async def _fetch_player_competitions(
+        self, username: str
+    ) -> Optional[List[ParticipationWithCompetition]]:
+        try:
+            response = await self._request(
+                "GET",
+                f"/players/{username}/competitions",
+                priority=Priority.READ,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             return None
 
+        if response.status != 200:
+            return None
+
+        return decode_participations(response.body)
+
     async def remove_competition_participant(
         self, competition_id: Union[str, int], rsn: str
     ) -> Tuple[int, str]:
-        async with self._session.delete(
-            f"{self._base}/competitions/{competition_id}/participants",
-            json={"participants": [rsn], "adminPassword": Config.SHARED_ADMIN_PASSWORD},
-            headers=Constants.HEADERS,
-            timeout=aiohttp.ClientTimeout(total=10),
-        ) as r:
-            return r.status, await r.text()
+        response = await self._request(
+            "DELETE",
+            f"/competitions/{competition_id}/participants",
+            priority=Priority.WRITE,
+            payload={"participants": [rsn], "adminPassword": Config.SHARED_ADMIN_PASSWORD},
+        )
+        return response.status, response.text
 
     async def verify_group(self, group_id: str) -> bool:
-        async with self._session.put(
-            f"{self._base}/groups/{group_id}/verify",
-            json={"adminPassword": Config.SHARED_ADMIN_PASSWORD},
-            headers=Constants.HEADERS,
-        ) as r:
-            return r.status == 200
+        try:
+            response = await self._request(
+                "PUT",
+                f"/groups/{group_id}/verify",
+                priority=Priority.WRITE,
+                payload={"adminPassword": Config.SHARED_ADMIN_PASSWORD},
+            )
+            return response.status == 200
+        finally:
+            self.invalidate_group(group_id)
 
     async def reset_group_code(self, group_id: Union[str, int]) -> Optional[Dict[str, Any]]:
         try:
-            async with self._session.put(
-                f"{self._base}/groups/{group_id}/reset-code",
-                json={"adminPassword": Config.SHARED_ADMIN_PASSWORD},
-                headers=Constants.HEADERS,
-                timeout=aiohttp.ClientTimeout(total=10),
-            ) as r:
-                return await r.json() if r.status == 200 else None
-        except (aiohttp.ClientError, TimeoutError):
+            response = await self._request(
+                "PUT",
+                f"/groups/{group_id}/reset-code",
+                priority=Priority.WRITE,
+                payload={"adminPassword": Config.SHARED_ADMIN_PASSWORD},
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             return None
+        finally:
+            self.invalidate_group(group_id)
+
+        return response.json() if response.status == 200 else None
 
     async def remove_player_group(
         self, rsn: str, group_id: Union[str, int]
     ) -> Optional[Dict[str, Any]]:
         try:
-            async with self._session.delete(
-                f"{self._base}/groups/{group_id}/members",
-                json={"members": [rsn], "adminPassword": Config.SHARED_ADMIN_PASSWORD},
-                headers=Constants.HEADERS,
-                timeout=aiohttp.ClientTimeout(total=10),
-            ) as r:
-                return await r.json() if r.status == 200 else None
-        except (aiohttp.ClientError, TimeoutError):
+            response = await self._request(
+                "DELETE",
+                f"/groups/{group_id}/members",
+                priority=Priority.WRITE,
+                payload={"members": [rsn], "adminPassword": Config.SHARED_ADMIN_PASSWORD},
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             return None
+        finally:
+            self.invalidate_group(group_id)
+
+        return response.json() if response.status == 200 else None
+
+    async def set_player_country(self, username: str, country: Optional[str]) -> bool:
+        try:
+            response = await self._request(
+                "PUT",
+                f"/players/{username}/country",
+                priority=Priority.WRITE,
+                payload={"country": country, "adminPassword": Config.SHARED_ADMIN_PASSWORD},
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+        return response.status == 200
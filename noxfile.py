@@ -59,11 +59,10 @@ def install(*packages: str) -> InjectorT:
     "mypy",
     "discord.py",
     "python-dotenv",
-    "requests",
     "PyJWT",
     "cryptography",
+    "msgspec",
     "uvloop",
-    "types-requests",
 )
 def types(session: nox.Session) -> None:
     session.run("mypy")